@@ -0,0 +1,479 @@
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .bulk import enroll_pairs
+from .dashboard import DASHBOARD_TABLES, dashboard_statements, build_dashboard
+from .database import get_async_db
+from .enrollments import enroll_student, enrollment_integrity_error, unenroll_student, waitlisted_students
+from .models import Student, Course, Enrollment
+from .pagination import MAX_PAGE_SIZE, keyset_statement, next_cursor_headers, async_ndjson_response
+from .read_cache import JSON_MEDIA_TYPE, list_cache, table_versions, conditional_response
+from .serialization import dumps, serialize_rows
+from .lookups import (
+    Expand, batch_ids, batch_statement, expanded_statement, expanded_tables, in_request_order, serialize_expanded
+)
+from .search import SEARCH_PAGE_SIZE, MAX_SEARCH_PAGE_SIZE, search_statement
+from .writes import insert_student, insert_course
+from .write_queue import arun_write
+from .change_feed import CHANGE_SEQ_HEADER, change_feed
+from .enrollment_graph import course_student_ids, student_course_ids
+from .recommendations import RECOMMENDATION_COUNT, TOP_K, recommended_courses
+from .schemas import (
+    StudentCreate, StudentOut, CourseCreate, CourseOut, EnrollCreate, EnrollmentOut, DashboardOut, CourseRecommendation,
+    EnrollBatch, EnrollBatchResult
+)
+
+logger = logging.getLogger(__name__)
+
+# AsyncSession twins of the CRUD, enrollment and roster routes in main.py,
+# mounted in their place when DB_ASYNC is on
+router = APIRouter()
+
+@router.post("/students/", response_model=StudentOut, status_code=status.HTTP_201_CREATED)
+async def create_student(student: StudentCreate, db: AsyncSession = Depends(get_async_db)):
+    try:
+        logger.info("Creating student: %s (%s)", student.name, student.email)
+
+        created = await arun_write(db, insert_student, student)
+        table_versions.bump("students")
+        change_feed.publish("student_created", created.model_dump())
+
+        logger.info("Student created successfully with ID: %s", created.id)
+        return created
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error creating student: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create student: {str(e)}"
+        )
+
+@router.get("/students/", response_model=list[StudentOut])
+async def get_students(
+    request: Request,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: int | None = Query(None, ge=0),
+    stream: bool = False,
+    expand: tuple[str, ...] = Depends(Expand(Student)),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if stream and expand:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="expand is not supported with stream"
+        )
+    try:
+        if stream:
+            return async_ndjson_response(Student, StudentOut, after=after, limit=limit)
+
+        async def build():
+            if expand:
+                # Related rows come back in the same round trips as the page, not one query per row
+                students = (await db.scalars(expanded_statement(Student, expand, after, limit))).all()
+                body = serialize_expanded(Student, StudentOut, students, expand)
+            else:
+                students = (await db.execute(keyset_statement(Student, after, limit, StudentOut))).all()
+                body = serialize_rows(students)
+            logger.info("Retrieved %s students", len(students))
+            return body, next_cursor_headers(students, limit)
+
+        return conditional_response(request, await list_cache.aget_or_build(expanded_tables(Student, expand), (after, limit, expand), build))
+    except Exception as e:
+        logger.error("Error retrieving students: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve students"
+        )
+
+@router.get("/students/batch", response_model=list[StudentOut])
+async def get_students_batch(ids: list[int] = Depends(batch_ids), db: AsyncSession = Depends(get_async_db)):
+    try:
+        rows = (await db.execute(batch_statement(Student, StudentOut, ids))).all()
+        logger.info("Resolved %s of %s students", len(rows), len(ids))
+        return Response(content=serialize_rows(in_request_order(rows, ids)), media_type=JSON_MEDIA_TYPE)
+    except Exception as e:
+        logger.error("Error resolving students batch: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve students"
+        )
+
+@router.get("/students/{student_id}", response_model=StudentOut)
+async def get_student(student_id: int, db: AsyncSession = Depends(get_async_db)):
+    try:
+        student = await db.get(Student, student_id)
+        if not student:
+            logger.warning("Student with ID %s not found", student_id)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Student not found"
+            )
+        return student
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error retrieving student %s: %s", student_id, e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve student"
+        )
+
+@router.post("/courses/", response_model=CourseOut, status_code=status.HTTP_201_CREATED)
+async def create_course(course: CourseCreate, db: AsyncSession = Depends(get_async_db)):
+    try:
+        logger.info("Creating course: %s (%s)", course.title, course.code)
+
+        created = await arun_write(db, insert_course, course)
+        table_versions.bump("courses")
+        change_feed.publish("course_created", created.model_dump())
+
+        logger.info("Course created successfully with ID: %s", created.id)
+        return created
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error creating course: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create course: {str(e)}"
+        )
+
+@router.get("/courses/", response_model=list[CourseOut])
+async def get_courses(
+    request: Request,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: int | None = Query(None, ge=0),
+    stream: bool = False,
+    expand: tuple[str, ...] = Depends(Expand(Course)),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if stream and expand:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="expand is not supported with stream"
+        )
+    try:
+        if stream:
+            return async_ndjson_response(Course, CourseOut, after=after, limit=limit)
+
+        async def build():
+            if expand:
+                # Related rows come back in the same round trips as the page, not one query per row
+                courses = (await db.scalars(expanded_statement(Course, expand, after, limit))).all()
+                body = serialize_expanded(Course, CourseOut, courses, expand)
+            else:
+                courses = (await db.execute(keyset_statement(Course, after, limit, CourseOut))).all()
+                body = serialize_rows(courses)
+            logger.info("Retrieved %s courses", len(courses))
+            return body, next_cursor_headers(courses, limit)
+
+        return conditional_response(request, await list_cache.aget_or_build(expanded_tables(Course, expand), (after, limit, expand), build))
+    except Exception as e:
+        logger.error("Error retrieving courses: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve courses"
+        )
+
+@router.get("/courses/search", response_model=list[CourseOut])
+async def search_courses(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=MAX_SEARCH_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        stmt = search_statement(db.bind.dialect.name, q, limit, offset)
+        if stmt is None:
+            return []
+        courses = (await db.scalars(stmt)).all()
+        logger.info("Search %r matched %s courses", q, len(courses))
+        return courses
+    except Exception as e:
+        logger.error("Error searching courses: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to search courses"
+        )
+
+@router.get("/courses/batch", response_model=list[CourseOut])
+async def get_courses_batch(ids: list[int] = Depends(batch_ids), db: AsyncSession = Depends(get_async_db)):
+    try:
+        rows = (await db.execute(batch_statement(Course, CourseOut, ids))).all()
+        logger.info("Resolved %s of %s courses", len(rows), len(ids))
+        return Response(content=serialize_rows(in_request_order(rows, ids)), media_type=JSON_MEDIA_TYPE)
+    except Exception as e:
+        logger.error("Error resolving courses batch: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve courses"
+        )
+
+@router.get("/courses/{course_id}", response_model=CourseOut)
+async def get_course(course_id: int, db: AsyncSession = Depends(get_async_db)):
+    try:
+        course = await db.get(Course, course_id)
+        if not course:
+            logger.warning("Course with ID %s not found", course_id)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Course not found"
+            )
+        return course
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error retrieving course %s: %s", course_id, e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve course"
+        )
+
+@router.post("/enroll/", status_code=status.HTTP_201_CREATED)
+async def enroll(enroll: EnrollCreate, db: AsyncSession = Depends(get_async_db)):
+    try:
+        logger.info("Enrolling student %s in course %s", enroll.student_id, enroll.course_id)
+
+        position = await arun_write(db, enroll_student, enroll.student_id, enroll.course_id)
+        if position is not None:
+            change_feed.publish("waitlisted", {
+                "student_id": enroll.student_id, "course_id": enroll.course_id, "position": position
+            })
+            return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={
+                "message": "Course is full; added to the waitlist",
+                "student_id": enroll.student_id,
+                "course_id": enroll.course_id,
+                "waitlist_position": position
+            })
+
+        table_versions.bump("enrollments", "courses")
+        change_feed.publish("enrolled", {"student_id": enroll.student_id, "course_id": enroll.course_id})
+
+        logger.info("Enrollment successful: student %s in course %s", enroll.student_id, enroll.course_id)
+        return {
+            "message": "Enrolled successfully",
+            "student_id": enroll.student_id,
+            "course_id": enroll.course_id
+        }
+
+    except HTTPException:
+        raise
+    except IntegrityError as e:
+        raise await db.run_sync(enrollment_integrity_error, e, enroll.student_id, enroll.course_id)
+    except Exception as e:
+        logger.error("Error during enrollment: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to enroll student: {str(e)}"
+        )
+
+@router.post("/enroll/batch", response_model=EnrollBatchResult)
+async def enroll_batch(batch: EnrollBatch, db: AsyncSession = Depends(get_async_db)):
+    try:
+        pairs = batch.pairs()
+        logger.info("Batch enrolling %s student/course pairs", len(pairs))
+
+        results = await arun_write(db, enroll_pairs, pairs)
+        enrolled = sum(1 for r in results if r.status == "enrolled")
+        if enrolled:
+            table_versions.bump("enrollments", "courses")
+        for r in results:
+            if r.status == "enrolled":
+                change_feed.publish("enrolled", {"student_id": r.student_id, "course_id": r.course_id})
+
+        logger.info("Batch enrollment finished: %s of %s enrolled", enrolled, len(pairs))
+        return EnrollBatchResult(enrolled=enrolled, failed=len(results) - enrolled, results=results)
+
+    except Exception as e:
+        logger.error("Error during batch enrollment: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to enroll students: {str(e)}"
+        )
+
+@router.get("/enrollments/", response_model=list[EnrollmentOut])
+async def get_enrollments(
+    request: Request,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: int | None = Query(None, ge=0),
+    stream: bool = False,
+    expand: tuple[str, ...] = Depends(Expand(Enrollment)),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if stream and expand:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="expand is not supported with stream"
+        )
+    try:
+        if stream:
+            return async_ndjson_response(Enrollment, EnrollmentOut, after=after, limit=limit)
+
+        async def build():
+            if expand:
+                # Related rows come back in the same round trips as the page, not one query per row
+                enrollments = (await db.scalars(expanded_statement(Enrollment, expand, after, limit))).all()
+                body = serialize_expanded(Enrollment, EnrollmentOut, enrollments, expand)
+            else:
+                enrollments = (await db.execute(keyset_statement(Enrollment, after, limit, EnrollmentOut))).all()
+                body = serialize_rows(enrollments)
+            logger.info("Retrieved %s enrollments", len(enrollments))
+            return body, next_cursor_headers(enrollments, limit)
+
+        return conditional_response(request, await list_cache.aget_or_build(expanded_tables(Enrollment, expand), (after, limit, expand), build))
+    except Exception as e:
+        logger.error("Error retrieving enrollments: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve enrollments"
+        )
+
+@router.get("/dashboard", response_model=DashboardOut)
+async def get_dashboard(request: Request, db: AsyncSession = Depends(get_async_db)):
+    try:
+        async def build():
+            position = change_feed.position
+            dashboard = build_dashboard(*[(await db.execute(stmt)).all() for stmt in dashboard_statements()])
+            logger.info("Built dashboard: %s students, %s courses", len(dashboard["students"]), len(dashboard["courses"]))
+            return dumps(dashboard), {CHANGE_SEQ_HEADER: position}
+
+        return conditional_response(request, await list_cache.aget_or_build(DASHBOARD_TABLES, None, build))
+    except Exception as e:
+        logger.error("Error building dashboard: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to build dashboard"
+        )
+
+@router.get("/students/{student_id}/courses/", response_model=list[CourseOut])
+async def student_courses(student_id: int, db: AsyncSession = Depends(get_async_db)):
+    try:
+        logger.info("Fetching courses for student %s", student_id)
+
+        course_ids = student_course_ids(student_id)
+        if course_ids:
+            # From the in-process enrollment graph: one primary-key IN lookup, no join
+            rows = (await db.execute(batch_statement(Course, CourseOut, course_ids))).all()
+            return Response(serialize_rows(in_request_order(rows, course_ids)), media_type=JSON_MEDIA_TYPE)
+
+        student = await db.get(Student, student_id)
+        if not student:
+            logger.warning("Student with ID %s not found", student_id)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Student not found"
+            )
+
+        courses = (await db.scalars(
+            select(Course).join(Enrollment).where(Enrollment.student_id == student_id)
+        )).all()
+        logger.info("Found %s courses for student %s", len(courses), student_id)
+        return courses
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching student courses: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch student courses"
+        )
+
+@router.delete("/students/{student_id}/courses/{course_id}")
+async def unenroll(student_id: int, course_id: int, db: AsyncSession = Depends(get_async_db)):
+    try:
+        logger.info("Unenrolling student %s from course %s", student_id, course_id)
+
+        promoted = await arun_write(db, unenroll_student, student_id, course_id)
+        table_versions.bump("enrollments", "courses")
+        change_feed.publish("unenrolled", {
+            "student_id": student_id, "course_id": course_id, "promoted_student_id": promoted
+        })
+
+        return {
+            "message": "Unenrolled successfully",
+            "student_id": student_id,
+            "course_id": course_id,
+            "promoted_student_id": promoted
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error during unenrollment: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to unenroll student: {str(e)}"
+        )
+
+@router.get("/courses/{course_id}/recommendations/", response_model=list[CourseRecommendation])
+async def course_recommendations(
+    course_id: int,
+    limit: int = Query(RECOMMENDATION_COUNT, ge=1, le=TOP_K),
+    db: AsyncSession = Depends(get_async_db),
+):
+    try:
+        return await db.run_sync(recommended_courses, course_id, limit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching course recommendations: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch course recommendations"
+        )
+
+@router.get("/courses/{course_id}/waitlist/", response_model=list[StudentOut])
+async def course_waitlist(course_id: int, db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await db.run_sync(waitlisted_students, course_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching course waitlist: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch course waitlist"
+        )
+
+@router.get("/courses/{course_id}/students/", response_model=list[StudentOut])
+async def course_students(course_id: int, db: AsyncSession = Depends(get_async_db)):
+    try:
+        logger.info("Fetching students for course %s", course_id)
+
+        student_ids = course_student_ids(course_id)
+        if student_ids:
+            # From the in-process enrollment graph: one primary-key IN lookup, no join
+            rows = (await db.execute(batch_statement(Student, StudentOut, student_ids))).all()
+            return Response(serialize_rows(in_request_order(rows, student_ids)), media_type=JSON_MEDIA_TYPE)
+
+        course = await db.get(Course, course_id)
+        if not course:
+            logger.warning("Course with ID %s not found", course_id)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Course not found"
+            )
+
+        students = (await db.scalars(
+            select(Student).join(Enrollment).where(Enrollment.course_id == course_id)
+        )).all()
+        logger.info("Found %s students for course %s", len(students), course_id)
+        return students
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching course students: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch course students"
+        )
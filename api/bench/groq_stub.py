@@ -0,0 +1,91 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+STUB_TIPS = [
+    "Block out fixed study sessions each week and protect them",
+    "Summarize every lecture in your own words the same day",
+    "Test yourself with practice questions before rereading notes",
+    "Work through problem sets with a study group",
+    "Use office hours early instead of the week before exams",
+]
+
+
+def create_stub_app(latency: float = 0.05) -> FastAPI:
+    """A stand-in for Groq's OpenAI-compatible chat completions endpoint.
+
+    Answers every request with the same tips after a fixed delay, so GenAI
+    benchmarks measure this service rather than the network or the model.
+    """
+    app = FastAPI()
+    content = "\n".join(f"{i}. {tip}" for i, tip in enumerate(STUB_TIPS, start=1))
+
+    def completion(body: dict, **fields) -> dict:
+        return {
+            "id": "chatcmpl-stub",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            **fields,
+        }
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+
+        if not body.get("stream"):
+            return completion(
+                body,
+                object="chat.completion",
+                choices=[{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            )
+
+        async def events():
+            for line in content.splitlines(keepends=True):
+                chunk = completion(
+                    body,
+                    object="chat.completion.chunk",
+                    choices=[{"index": 0, "delta": {"content": line}, "finish_reason": None}],
+                )
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class StubServer:
+    """Runs the stub in a background thread; use as a context manager."""
+
+    def __init__(self, latency: float = 0.05, port: int | None = None):
+        self.port = port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._server = uvicorn.Server(uvicorn.Config(
+            create_stub_app(latency), host="127.0.0.1", port=self.port, log_level="warning"
+        ))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def __enter__(self) -> "StubServer":
+        self._thread.start()
+        while not self._server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError(f"Groq stub failed to start on port {self.port}")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.should_exit = True
+        self._thread.join()
@@ -0,0 +1,376 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from importlib.util import find_spec
+from typing import Callable
+
+import httpx
+
+from .groq_stub import StubServer, free_port
+from .seed import SCALES, DatasetSize, enrollment_pair, seed_database
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_CONCURRENCY = [1, 8, 32]
+DEFAULT_REQUESTS = 200
+WARMUP_REQUESTS = 5
+RSS_SAMPLE_INTERVAL = 0.02  # seconds
+
+
+@dataclass
+class Endpoint:
+    """One route to drive. make_request returns (path, request kwargs) for each call."""
+    name: str
+    method: str
+    make_request: Callable[["Workload"], tuple[str, dict]]
+    # Endpoints that return whole tables get a tenth of the requests
+    heavy: bool = False
+    # Optional packages the route needs; without them it is skipped rather than timed answering 503
+    requires: tuple[str, ...] = ()
+    # Server settings the route needs, applied when it is selected
+    env: dict[str, str] = field(default_factory=dict)
+    # Polled before timing until it stops answering 503, for routes served from something built in the background
+    ready_path: str | None = None
+
+    def available(self) -> bool:
+        return all(find_spec(module) is not None for module in self.requires)
+
+
+@dataclass
+class Workload:
+    """Hands out ids that exist in, or are new to, the seeded dataset."""
+    size: DatasetSize
+    rng: random.Random
+    run_id: str
+    _serial: itertools.count = field(default_factory=lambda: itertools.count(1))
+    # Seeded enrollments are handed out back to front to the unenroll benchmark
+    _unenroll_cursor: itertools.count = field(default_factory=itertools.count)
+
+    def student_id(self) -> int:
+        return self.rng.randint(1, self.size.students)
+
+    def course_id(self) -> int:
+        return self.rng.randint(1, self.size.courses)
+
+    def serial(self) -> int:
+        return next(self._serial)
+
+    def seeded_enrollment(self) -> tuple[int, int]:
+        return enrollment_pair(self.size.enrollments - 1 - next(self._unenroll_cursor), self.size)
+
+
+def _csv(header: str, rows) -> dict:
+    return {"content": header + "\n" + "\n".join(rows) + "\n", "headers": {"content-type": "text/csv"}}
+
+
+def _tips_body(w: Workload) -> dict:
+    # A small set of titles, so the tips cache sees a realistic mix of hits and misses
+    course = w.rng.randint(1, 20)
+    return {"course_title": f"Course {course}", "credit_units": 1 + course % 4}
+
+
+ENDPOINTS = [
+    Endpoint("GET /", "GET", lambda w: ("/", {})),
+    Endpoint("GET /health", "GET", lambda w: ("/health", {})),
+    Endpoint("GET /metrics", "GET", lambda w: ("/metrics", {})),
+    Endpoint("GET /debug/endpoints", "GET", lambda w: ("/debug/endpoints", {})),
+    Endpoint("POST /students/", "POST", lambda w: ("/students/", {"json": {
+        "name": "Bench", "email": f"new{w.serial()}-{w.run_id}@bench.example.com"}})),
+    Endpoint("GET /students/", "GET", lambda w: ("/students/", {}), heavy=True),
+    Endpoint("GET /students/?limit=100", "GET", lambda w: ("/students/", {"params": {
+        "limit": 100, "after": w.rng.randint(0, max(0, w.size.students - 100))}})),
+    Endpoint("GET /students/?limit=100&expand=courses", "GET", lambda w: ("/students/", {"params": {
+        "limit": 100, "after": w.rng.randint(0, max(0, w.size.students - 100)), "expand": "courses"}})),
+    Endpoint("GET /students/?stream=true", "GET", lambda w: ("/students/", {"params": {"stream": "true"}}), heavy=True),
+    Endpoint("GET /students/batch", "GET", lambda w: ("/students/batch", {"params": {
+        "ids": ",".join(str(w.student_id()) for _ in range(50))}})),
+    Endpoint("GET /students/{id}", "GET", lambda w: (f"/students/{w.student_id()}", {})),
+    Endpoint("GET /students/{id}/courses/", "GET", lambda w: (f"/students/{w.student_id()}/courses/", {})),
+    Endpoint("POST /courses/", "POST", lambda w: ("/courses/", {"json": {
+        "title": "Bench", "code": f"NEW{w.serial()}-{w.run_id}", "credit_units": 3}})),
+    Endpoint("GET /courses/", "GET", lambda w: ("/courses/", {})),
+    Endpoint("GET /courses/?limit=100&expand=students", "GET", lambda w: ("/courses/", {"params": {
+        "limit": 100, "after": w.rng.randint(0, max(0, w.size.courses - 100)), "expand": "students"}})),
+    Endpoint("GET /courses/batch", "GET", lambda w: ("/courses/batch", {"params": {
+        "ids": ",".join(str(w.course_id()) for _ in range(50))}})),
+    # Seeded courses are titled "Course <id>" with codes BENCH<id:06d>; the last word is always a prefix
+    Endpoint("GET /courses/search?q=<words>", "GET", lambda w: ("/courses/search", {"params": {
+        "q": f"course {w.course_id()}"}})),
+    Endpoint("GET /courses/search?q=<prefix>", "GET", lambda w: ("/courses/search", {"params": {
+        "q": f"BENCH{w.course_id():06d}"[:-2]}})),
+    Endpoint("GET /courses/{id}", "GET", lambda w: (f"/courses/{w.course_id()}", {})),
+    Endpoint("GET /courses/{id}/students/", "GET", lambda w: (f"/courses/{w.course_id()}/students/", {})),
+    Endpoint("GET /courses/{id}/waitlist/", "GET", lambda w: (f"/courses/{w.course_id()}/waitlist/", {})),
+    Endpoint("GET /courses/{id}/recommendations/", "GET",
+             lambda w: (f"/courses/{w.course_id()}/recommendations/", {}),
+             requires=("numpy", "scipy"), env={"RECOMMENDATIONS": "true"}, ready_path="/courses/1/recommendations/"),
+    Endpoint("POST /enroll/", "POST", lambda w: ("/enroll/", {"json": {
+        "student_id": w.student_id(), "course_id": w.course_id()}})),
+    Endpoint("POST /enroll/batch", "POST", lambda w: ("/enroll/batch", {"json": {
+        "student_id": w.student_id(), "course_ids": w.rng.sample(range(1, w.size.courses + 1), 5)}})),
+    Endpoint("DELETE /students/{id}/courses/{id}", "DELETE",
+             lambda w: ("/students/{}/courses/{}".format(*w.seeded_enrollment()), {})),
+    Endpoint("GET /enrollments/?limit=1000", "GET", lambda w: ("/enrollments/", {"params": {
+        "limit": 1000, "after": w.rng.randint(0, max(0, w.size.enrollments - 1000))}})),
+    Endpoint("GET /enrollments/?limit=1000&expand=student,course", "GET", lambda w: ("/enrollments/", {"params": {
+        "limit": 1000, "after": w.rng.randint(0, max(0, w.size.enrollments - 1000)), "expand": "student,course"}})),
+    Endpoint("GET /dashboard", "GET", lambda w: ("/dashboard", {}), heavy=True),
+    Endpoint("GET /export/roster", "GET", lambda w: ("/export/roster", {}), heavy=True),
+    Endpoint("GET /export/roster?gzip=true", "GET", lambda w: ("/export/roster", {"params": {"gzip": "true"}}), heavy=True),
+    Endpoint("GET /export/roster?format=parquet", "GET", lambda w: ("/export/roster", {"params": {
+        "format": "parquet"}}), heavy=True, requires=("pyarrow",)),
+    Endpoint("POST /students/bulk", "POST", lambda w: ("/students/bulk", _csv("name,email", (
+        f"Bulk,bulk{w.serial()}-{w.run_id}@bench.example.com" for _ in range(100))))),
+    Endpoint("POST /courses/bulk", "POST", lambda w: ("/courses/bulk", _csv("title,code,credit_units", (
+        f"Bulk,BULK{w.serial()}-{w.run_id},3" for _ in range(100))))),
+    Endpoint("POST /enrollments/bulk", "POST", lambda w: ("/enrollments/bulk", _csv("student_id,course_id", (
+        f"{w.student_id()},{w.course_id()}" for _ in range(100))))),
+    Endpoint("POST /genai/study-tips", "POST", lambda w: ("/genai/study-tips", {"json": _tips_body(w)})),
+    Endpoint("GET /genai/study-tips/stream", "GET", lambda w: ("/genai/study-tips/stream", {"params": _tips_body(w)})),
+    Endpoint("GET /genai/study-tips/cache", "GET", lambda w: ("/genai/study-tips/cache", {})),
+]
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    # Nearest-rank, so every reported value is one that was actually measured
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), math.ceil(pct / 100 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: list[float], statuses: dict[int, int], errors: int, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors + sum(count for code, count in statuses.items() if code >= 500),
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(ordered, 50)),
+            "p95": ms(percentile(ordered, 95)),
+            "p99": ms(percentile(ordered, 99)),
+            "mean": ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+            "max": ms(ordered[-1]) if ordered else 0.0,
+        },
+    }
+
+
+def read_rss_bytes(pid: int, field_name: str = "VmRSS") -> int | None:
+    # Linux only; elsewhere the memory columns come out as null
+    try:
+        with open(f"/proc/{pid}/status") as status_file:
+            for line in status_file:
+                if line.startswith(field_name + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+async def sample_peak_rss(pid: int, stop: asyncio.Event) -> int | None:
+    peak = None
+    while True:
+        rss = read_rss_bytes(pid)
+        if rss is not None:
+            peak = max(peak or 0, rss)
+        try:
+            await asyncio.wait_for(stop.wait(), RSS_SAMPLE_INTERVAL)
+            return peak
+        except asyncio.TimeoutError:
+            pass
+
+
+async def drive(client: httpx.AsyncClient, endpoint: Endpoint, workload: Workload,
+                requests: int, concurrency: int, server_pid: int | None = None) -> dict:
+    """Send `requests` calls to one endpoint from `concurrency` concurrent workers."""
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    errors = 0
+    remaining = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        while next(remaining) < requests:
+            path, kwargs = endpoint.make_request(workload)
+            started = time.perf_counter()
+            try:
+                response = await client.request(endpoint.method, path, **kwargs)
+            except httpx.HTTPError as e:
+                errors += 1
+                logger.debug("%s failed: %r", endpoint.name, e)
+                continue
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_peak_rss(server_pid, stop)) if server_pid else None
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    peak_rss = await sampler if sampler else None
+
+    return {
+        "endpoint": endpoint.name,
+        "concurrency": concurrency,
+        **summarize(latencies, statuses, errors, elapsed),
+        "peak_rss_mb": round(peak_rss / 2**20, 1) if peak_rss else None,
+    }
+
+
+async def run_suite(base_url: str, workload: Workload, concurrency_levels: list[int], requests: int,
+                    endpoints: list[Endpoint], server_pid: int | None = None) -> list[dict]:
+    results = []
+    limits = httpx.Limits(max_connections=max(concurrency_levels), max_keepalive_connections=max(concurrency_levels))
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        for endpoint in endpoints:
+            count = max(1, requests // 10) if endpoint.heavy else requests
+            await drive(client, endpoint, workload, min(WARMUP_REQUESTS, count), 1)
+            for concurrency in concurrency_levels:
+                result = await drive(client, endpoint, workload, count, concurrency, server_pid)
+                logger.info(
+                    "%s c=%s: %s req/s, p99 %s ms",
+                    endpoint.name, concurrency, result["throughput_rps"], result["latency_ms"]["p99"]
+                )
+                results.append(result)
+    return results
+
+
+def start_api_server(database_url: str, groq_base_url: str, port: int,
+                     extra_env: dict[str, str] | None = None) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        **(extra_env or {}),
+        "DATABASE_URL": database_url,
+        "GROQ_API_KEY": "bench-stub-key",
+        "GROQ_BASE_URL": groq_base_url,
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=REPO_ROOT, env=env,
+    )
+
+
+def wait_until_healthy(base_url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("API server did not become healthy in time")
+
+
+def wait_until_ready(base_url: str, process: subprocess.Popen, paths: list[str], timeout: float = 600):
+    """Wait for routes served from background-built state to stop answering 503."""
+    deadline = time.monotonic() + timeout
+    for path in paths:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"API server exited with code {process.returncode}")
+            try:
+                if httpx.get(f"{base_url}{path}", timeout=5).status_code != 503:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{path} was still unavailable after {timeout:.0f} s")
+            time.sleep(0.2)
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed an isolated database, load every API route and report JSON.")
+    parser.add_argument("--scale", choices=SCALES, default="10k")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="per endpoint and concurrency level")
+    parser.add_argument("--endpoints", nargs="+", metavar="SUBSTRING",
+                        help="only run endpoints whose name contains one of these, e.g. /students")
+    parser.add_argument("--groq-latency", type=float, default=0.05, help="seconds the Groq stub waits per call")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the request mix")
+    parser.add_argument("--workdir", help="where to put the database (default: a new temp directory)")
+    parser.add_argument("--output", "-o", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="enrollment-bench-")
+    database_url = f"sqlite:///{os.path.join(workdir, f'bench-{args.scale}.db')}"
+    size = DatasetSize.for_scale(args.scale)
+    seed_seconds = seed_database(database_url, size)
+
+    endpoints = ENDPOINTS
+    if args.endpoints:
+        endpoints = [e for e in ENDPOINTS if any(part in e.name for part in args.endpoints)]
+    for endpoint in endpoints:
+        if not endpoint.available():
+            logger.warning("Skipping %s: needs %s installed", endpoint.name, ", ".join(endpoint.requires))
+    endpoints = [e for e in endpoints if e.available()]
+    server_env = {key: value for e in endpoints for key, value in e.env.items()}
+    workload = Workload(size, random.Random(args.seed), run_id=f"{args.seed}-{int(time.time())}")
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with StubServer(latency=args.groq_latency) as stub:
+        server = start_api_server(database_url, stub.url, port, server_env)
+        try:
+            wait_until_healthy(base_url, server)
+            wait_until_ready(base_url, server, [e.ready_path for e in endpoints if e.ready_path])
+            results = asyncio.run(run_suite(base_url, workload, args.concurrency, args.requests, endpoints, server.pid))
+            peak_rss = read_rss_bytes(server.pid, "VmHWM")
+        finally:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database_url": database_url,
+            "dataset": {**vars(size), "scale": args.scale, "seed_seconds": round(seed_seconds, 2)},
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "groq_stub_latency": args.groq_latency,
+            "server_peak_rss_mb": round(peak_rss / 2**20, 1) if peak_rss else None,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as report_file:
+            report_file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
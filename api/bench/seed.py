@@ -0,0 +1,96 @@
+import argparse
+import dataclasses
+import logging
+import time
+from collections import Counter
+
+from sqlalchemy import insert
+
+from ..config import get_settings
+from ..database import Base, create_db_engine
+from ..models import Student, Course, Enrollment
+
+logger = logging.getLogger(__name__)
+
+# Students and enrollments per preset; courses scale at one per hundred students
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+SEED_CHUNK = 10_000
+
+
+@dataclasses.dataclass(frozen=True)
+class DatasetSize:
+    students: int
+    courses: int
+    enrollments: int
+
+    @classmethod
+    def for_scale(cls, scale: str) -> "DatasetSize":
+        n = SCALES[scale]
+        return cls(students=n, courses=max(50, n // 100), enrollments=n)
+
+
+def enrollment_pair(index: int, size: DatasetSize) -> tuple[int, int]:
+    """The (student_id, course_id) of the index-th seeded enrollment.
+
+    Deterministic, so benchmarks can pick rows that are known to exist without
+    querying for them, and the same dataset comes out on every run.
+    """
+    student = index % size.students
+    round_ = index // size.students
+    course = (student * 31 + round_ * 17) % size.courses
+    return student + 1, course + 1
+
+
+def _chunks(rows, size: int = SEED_CHUNK):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def seed_database(database_url: str, size: DatasetSize) -> float:
+    """Create the schema in a fresh database and fill it; returns the seconds taken."""
+    started = time.perf_counter()
+    engine = create_db_engine(dataclasses.replace(get_settings(), database_url=database_url))
+    Base.metadata.create_all(bind=engine)
+
+    seats = Counter(enrollment_pair(i, size)[1] for i in range(size.enrollments))
+
+    with engine.begin() as conn:
+        for chunk in _chunks(
+            {"id": i, "name": f"Student {i}", "email": f"student{i}@bench.example.com"}
+            for i in range(1, size.students + 1)
+        ):
+            conn.execute(insert(Student), chunk)
+        for chunk in _chunks(
+            {"id": i, "title": f"Course {i}", "code": f"BENCH{i:06d}", "credit_units": 1 + i % 4,
+             "description": None, "capacity": None, "enrolled_count": seats[i]}
+            for i in range(1, size.courses + 1)
+        ):
+            conn.execute(insert(Course), chunk)
+        pairs = (enrollment_pair(i, size) for i in range(size.enrollments))
+        for chunk in _chunks({"student_id": s, "course_id": c} for s, c in pairs):
+            conn.execute(insert(Enrollment), chunk)
+
+    engine.dispose()
+    elapsed = time.perf_counter() - started
+    logger.info("Seeded %s students, %s courses and %s enrollments in %.1fs", size.students, size.courses, size.enrollments, elapsed)
+    return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill a new database with a synthetic benchmark dataset.")
+    parser.add_argument("database_url", help="e.g. sqlite:///bench.db; the database should be empty")
+    parser.add_argument("--scale", choices=SCALES, default="10k")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    seed_database(args.database_url, DatasetSize.for_scale(args.scale))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_TOP = 15
+
+# Runs in a fresh interpreter: import the app, then run its lifespan startup
+# the way uvicorn would before accepting connections
+PROBE = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+from api.main import app
+imported = time.perf_counter()
+
+async def start():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+ready = asyncio.run(start())
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "lifespan_ms": (ready - imported) * 1000,
+    "loaded": sorted(name for name in ("groq", "httpx", "api.async_routes", "aiosqlite", "numpy", "scipy") if name in sys.modules),
+}))
+"""
+
+
+@dataclass
+class ImportEntry:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(stderr: str) -> list[ImportEntry]:
+    """Parse the `-X importtime` log, one entry per module in import order."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue  # the column header
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        entries.append(ImportEntry(name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def by_package(entries: list[ImportEntry]) -> dict[str, int]:
+    """Self time summed per top-level package, so e.g. every pydantic submodule counts once."""
+    totals = defaultdict(int)
+    for entry in entries:
+        totals[entry.module.split(".")[0]] += entry.self_us
+    return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+def profile_startup(env: dict | None = None) -> dict:
+    """Start the app once in a fresh interpreter and report where the time went."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=REPO_ROOT, env={**os.environ, **(env or {})}, capture_output=True, text=True, check=True,
+    )
+    entries = parse_importtime(result.stderr)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    return {
+        **timings,
+        "packages_us": by_package(entries),
+        "slowest_modules": [asdict(e) for e in sorted(entries, key=lambda e: -e.self_us)],
+    }
+
+
+def format_report(report: dict, top: int = DEFAULT_TOP) -> str:
+    lines = [
+        f"import api.main   {report['import_ms']:8.1f} ms",
+        f"lifespan startup  {report['lifespan_ms']:8.1f} ms",
+        f"optional modules loaded: {', '.join(report['loaded']) or 'none'}",
+        "",
+        "Self time by package:",
+    ]
+    lines += [f"  {us / 1000:8.1f} ms  {name}" for name, us in list(report["packages_us"].items())[:top]]
+    lines += ["", "Slowest modules (self time):"]
+    lines += [f"  {e['self_us'] / 1000:8.1f} ms  {e['module']}" for e in report["slowest_modules"][:top]]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report where a worker's cold start time goes.")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP, help="rows per table")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    parser.add_argument("--database-url", help="defaults to a new empty SQLite file, so the lifespan "
+                                               "time includes creating the schema")
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='enrollment-startup-'), 'startup.db')}"
+    report = profile_startup({"DATABASE_URL": database_url, "LOG_LEVEL": "WARNING"})
+    print(json.dumps(report, indent=2) if args.json else format_report(report, args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+import abc
+import argparse
+import csv
+import io
+import json
+import logging
+import sys
+import tempfile
+from collections import defaultdict
+from typing import Iterable, Iterator
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .enrollments import claim_seats
+from .models import Student, Course, Enrollment
+from .read_cache import table_versions
+from .schemas import StudentCreate, CourseCreate, EnrollCreate, BulkRowError, BulkImportResult, EnrollPairResult
+
+logger = logging.getLogger(__name__)
+
+# Rows per transaction / multi-row INSERT
+DEFAULT_BATCH_SIZE = 500
+# Uploads larger than this are spooled to a temp file instead of memory
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+# Per-row errors beyond this are only counted, so a bad file can't blow up the report
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ("csv", "ndjson")
+CONTENT_TYPE_FORMATS = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/json": "ndjson",
+}
+
+
+def format_from_content_type(content_type: str | None) -> str | None:
+    if not content_type:
+        return None
+    return CONTENT_TYPE_FORMATS.get(content_type.split(";")[0].strip().lower())
+
+
+def iter_records(text: Iterable[str], fmt: str) -> Iterator[tuple[int, dict | None, str | None]]:
+    """Parse the upload lazily, yielding (row number, record, parse error)."""
+    if fmt == "csv":
+        for row_number, record in enumerate(csv.DictReader(text), start=1):
+            # Blank cells mean "not provided", e.g. an empty description column
+            yield row_number, {k: v for k, v in record.items() if k and v not in (None, "")}, None
+    elif fmt == "ndjson":
+        for row_number, line in enumerate(text, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield row_number, None, f"invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield row_number, None, "expected a JSON object"
+                continue
+            yield row_number, record, None
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+class BulkImporter(abc.ABC):
+    model = None
+    schema = None
+    # Tables whose cached list responses a committed batch invalidates
+    tables = ()
+
+    @abc.abstractmethod
+    def find_conflicts(self, db: Session, rows: list[tuple[int, dict]]) -> dict[int, BulkRowError]:
+        """Return the rows of a batch that can't be inserted, keyed by row number."""
+
+    def reserve(self, db: Session, rows: list[tuple[int, dict]], conflicts: dict[int, BulkRowError]) -> list[tuple[int, dict]]:
+        """Claim whatever the rows need in the insert's transaction; returns the rows that got it.
+
+        Rows that can't be reserved are added to conflicts.
+        """
+        return rows
+
+    def insert_rows(self, db: Session, values: list[dict]):
+        db.execute(insert(self.model).values(values))
+
+    def import_batch(self, db: Session, rows: list[tuple[int, dict]], result: BulkImportResult):
+        inserted = result.inserted
+        self.stage_batch(db, rows, result)
+        db.commit()
+        if result.inserted > inserted:
+            table_versions.bump(*self.tables)
+
+    def stage_batch(self, db: Session, rows: list[tuple[int, dict]], result: BulkImportResult):
+        """import_batch without the commit, for callers that own the transaction (e.g. the write queue)."""
+        conflicts = self.find_conflicts(db, rows)
+        accepted = [(row_number, values) for row_number, values in rows if row_number not in conflicts]
+
+        if accepted:
+            try:
+                # A savepoint rather than the transaction, so a conflict undoes only this batch
+                with db.begin_nested():
+                    reserved = self.reserve(db, accepted, conflicts)
+                    if reserved:
+                        self.insert_rows(db, [values for _, values in reserved])
+                result.inserted += len(reserved)
+            except IntegrityError:
+                # Someone else wrote a conflicting row since find_conflicts ran;
+                # retry one row at a time so only the offending rows are rejected
+                self._insert_one_by_one(db, accepted, result, conflicts)
+
+        for error in conflicts.values():
+            record_error(result, error)
+
+    def _insert_one_by_one(self, db: Session, rows, result, conflicts):
+        for row_number, values in rows:
+            # The failed batch may already have marked this row; its reservation was rolled back
+            conflicts.pop(row_number, None)
+            try:
+                with db.begin_nested():
+                    reserved = self.reserve(db, [(row_number, values)], conflicts)
+                    if reserved:
+                        self.insert_rows(db, [values])
+                result.inserted += len(reserved)
+            except IntegrityError as e:
+                conflicts[row_number] = BulkRowError(row=row_number, error="conflict", detail=str(e.orig))
+
+    def run(self, records: Iterable[tuple[int, dict | None, str | None]],
+            batch_size: int = DEFAULT_BATCH_SIZE, session_factory=SessionLocal) -> BulkImportResult:
+        result = BulkImportResult()
+        batch = []
+        db = session_factory()
+        try:
+            for row_number, record, parse_error in records:
+                result.received += 1
+                if parse_error:
+                    record_error(result, BulkRowError(row=row_number, error="invalid_row", detail=parse_error))
+                    continue
+                try:
+                    values = self.schema.model_validate(record).model_dump()
+                except ValidationError as e:
+                    record_error(result, BulkRowError(
+                        row=row_number, error="invalid_row",
+                        detail="; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+                    ))
+                    continue
+                batch.append((row_number, values))
+                if len(batch) >= batch_size:
+                    self.import_batch(db, batch, result)
+                    batch = []
+            if batch:
+                self.import_batch(db, batch, result)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        logger.info(
+            "Bulk import into %s: %s inserted, %s failed out of %s",
+            self.model.__tablename__, result.inserted, result.failed, result.received
+        )
+        return result
+
+
+def record_error(result: BulkImportResult, error: BulkRowError):
+    result.failed += 1
+    if len(result.errors) < MAX_REPORTED_ERRORS:
+        result.errors.append(error)
+
+
+def _dedupe(rows, key, error, detail, conflicts):
+    # Reject repeats of a key inside the same upload; the first occurrence wins
+    seen = set()
+    for row_number, values in rows:
+        k = key(values)
+        if k in seen:
+            conflicts[row_number] = BulkRowError(row=row_number, error=error, detail=detail)
+        seen.add(k)
+
+
+class StudentImporter(BulkImporter):
+    model = Student
+    schema = StudentCreate
+    tables = ("students",)
+
+    def find_conflicts(self, db, rows):
+        conflicts = {}
+        emails = {values["email"] for _, values in rows}
+        existing = set(db.scalars(select(Student.email).where(Student.email.in_(emails))))
+        for row_number, values in rows:
+            if values["email"] in existing:
+                conflicts[row_number] = BulkRowError(
+                    row=row_number, error="duplicate_email", detail="Student with this email already exists"
+                )
+        _dedupe(rows, lambda v: v["email"], "duplicate_email", "Email repeated in upload", conflicts)
+        return conflicts
+
+
+class CourseImporter(BulkImporter):
+    model = Course
+    schema = CourseCreate
+    tables = ("courses",)
+
+    def find_conflicts(self, db, rows):
+        conflicts = {}
+        codes = {values["code"] for _, values in rows}
+        existing = set(db.scalars(select(Course.code).where(Course.code.in_(codes))))
+        for row_number, values in rows:
+            if values["code"] in existing:
+                conflicts[row_number] = BulkRowError(
+                    row=row_number, error="duplicate_code", detail="Course with this code already exists"
+                )
+        _dedupe(rows, lambda v: v["code"], "duplicate_code", "Course code repeated in upload", conflicts)
+        return conflicts
+
+
+class EnrollmentImporter(BulkImporter):
+    model = Enrollment
+    schema = EnrollCreate
+    tables = ("enrollments", "courses")
+
+    def find_conflicts(self, db, rows):
+        conflicts = {}
+        student_ids = {values["student_id"] for _, values in rows}
+        course_ids = {values["course_id"] for _, values in rows}
+
+        known_students = set(db.scalars(select(Student.id).where(Student.id.in_(student_ids))))
+        known_courses = set(db.scalars(select(Course.id).where(Course.id.in_(course_ids))))
+        pairs = {(values["student_id"], values["course_id"]) for _, values in rows}
+        existing = set(db.execute(
+            select(Enrollment.student_id, Enrollment.course_id)
+            .where(tuple_(Enrollment.student_id, Enrollment.course_id).in_(pairs))
+        ).tuples())
+
+        for row_number, values in rows:
+            pair = (values["student_id"], values["course_id"])
+            if pair[0] not in known_students:
+                conflicts[row_number] = BulkRowError(row=row_number, error="student_not_found", detail="Student not found")
+            elif pair[1] not in known_courses:
+                conflicts[row_number] = BulkRowError(row=row_number, error="course_not_found", detail="Course not found")
+            elif pair in existing:
+                conflicts[row_number] = BulkRowError(
+                    row=row_number, error="duplicate_enrollment", detail="Student already enrolled in this course"
+                )
+        _dedupe(rows, lambda v: (v["student_id"], v["course_id"]), "duplicate_enrollment",
+                "Enrollment repeated in upload", conflicts)
+        return conflicts
+
+    def reserve(self, db, rows, conflicts):
+        by_course = defaultdict(list)
+        for row_number, values in rows:
+            by_course[values["course_id"]].append(row_number)
+
+        reserved = set()
+        for course_id, row_numbers in by_course.items():
+            # Usually one UPDATE per course takes every seat the batch needs
+            if db.execute(claim_seats(course_id, len(row_numbers))).rowcount:
+                reserved.update(row_numbers)
+                continue
+            # Not enough room for all of them: seat rows in upload order until the course fills
+            for index, row_number in enumerate(row_numbers):
+                if not db.execute(claim_seats(course_id)).rowcount:
+                    for full_row in row_numbers[index:]:
+                        conflicts[full_row] = BulkRowError(row=full_row, error="course_full", detail="Course is full")
+                    break
+                reserved.add(row_number)
+        return [(row_number, values) for row_number, values in rows if row_number in reserved]
+
+
+IMPORTERS = {
+    "students": StudentImporter(),
+    "courses": CourseImporter(),
+    "enrollments": EnrollmentImporter(),
+}
+
+
+def enroll_pairs(db: Session, pairs: list[tuple[int, int]]) -> list[EnrollPairResult]:
+    """Enroll (student_id, course_id) pairs, reporting per pair; a write operation, so the caller commits."""
+    rows = [(index, {"student_id": student_id, "course_id": course_id})
+            for index, (student_id, course_id) in enumerate(pairs, start=1)]
+    result = BulkImportResult()
+    IMPORTERS["enrollments"].stage_batch(db, rows, result)
+
+    errors = {error.row: error for error in result.errors}
+    return [
+        EnrollPairResult(
+            student_id=values["student_id"],
+            course_id=values["course_id"],
+            status=errors[index].error if index in errors else "enrolled",
+            detail=errors[index].detail if index in errors else None,
+        )
+        for index, values in rows
+    ]
+
+
+def import_file(kind: str, fileobj, fmt: str, batch_size: int = DEFAULT_BATCH_SIZE) -> BulkImportResult:
+    """Import a binary file object; used by both the HTTP endpoints and the CLI."""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        return IMPORTERS[kind].run(iter_records(text, fmt), batch_size=batch_size)
+    finally:
+        text.detach()
+
+
+async def spool_request_body(request) -> tempfile.SpooledTemporaryFile:
+    """Copy a streamed request body into a spooled file, keeping memory bounded."""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import students, courses or enrollments from CSV or NDJSON")
+    parser.add_argument("kind", choices=sorted(IMPORTERS))
+    parser.add_argument("path", help="File to import, or - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    fmt = args.format
+    if fmt is None:
+        fmt = "csv" if args.path.lower().endswith(".csv") else "ndjson"
+
+    if args.path == "-":
+        result = import_file(args.kind, sys.stdin.buffer, fmt, args.batch_size)
+    else:
+        with open(args.path, "rb") as f:
+            result = import_file(args.kind, f, fmt, args.batch_size)
+
+    print(result.model_dump_json(indent=2))
+    return 1 if result.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
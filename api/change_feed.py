@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import threading
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable
+
+from .serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Events kept for clients resuming with Last-Event-ID
+HISTORY_SIZE = 1000
+# Events a slow client may fall behind by before it is told to refetch
+SUBSCRIBER_BUFFER = 256
+# Seconds between keep-alive comments on an idle stream, so proxies don't drop it
+HEARTBEAT_INTERVAL = 15
+# Milliseconds a disconnected EventSource waits before reconnecting
+RETRY_MS = 3000
+
+CHANGE_SEQ_HEADER = "X-Change-Seq"
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    seq: int
+    kind: str
+    data: dict
+    epoch: str = ""
+
+    @property
+    def id(self) -> str:
+        return f"{self.epoch}-{self.seq}"
+
+    def sse(self) -> str:
+        return f"id: {self.id}\nevent: {self.kind}\ndata: {dumps(self.data).decode()}\n\n"
+
+
+class _Subscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(SUBSCRIBER_BUFFER)
+        self.overflowed = False
+
+    def deliver(self, event: ChangeEvent):
+        # publish() may run on a threadpool worker; hop onto the stream's loop
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # loop already closed; the stream is going away
+
+    def _put(self, event: ChangeEvent):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Rather than block writers on a slow reader, drop its backlog and make it resync
+            self.overflowed = True
+
+
+class ChangeFeed:
+    """In-process fan-out of compact change events to Server-Sent Events streams.
+
+    Every event gets the next sequence number, and its ID is "<epoch>-<seq>",
+    where the epoch is random per ChangeFeed, so per process. The last
+    HISTORY_SIZE events are kept, so a client reconnecting with Last-Event-ID
+    gets what it missed. A client that is too far behind, or whose ID comes
+    from another epoch (a restart, or another worker), gets a `reset` event
+    telling it to refetch instead.
+    """
+
+    def __init__(self, history: int = HISTORY_SIZE):
+        self._lock = threading.Lock()
+        self.epoch = uuid.uuid4().hex[:12]
+        self._seq = 0
+        self._history: deque[ChangeEvent] = deque(maxlen=history)
+        self._subscribers: set[_Subscription] = set()
+        self._listeners: list[Callable[[ChangeEvent], None]] = []
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    @property
+    def position(self) -> str:
+        """The ID of the latest event, for clients to resume after; see X-Change-Seq."""
+        return f"{self.epoch}-{self._seq}"
+
+    def add_listener(self, listener: Callable[[ChangeEvent], None]):
+        """Call listener(event) on every publish, e.g. to keep an in-process read model current."""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def publish(self, kind: str, data: dict) -> ChangeEvent:
+        """Record an event; call after the change it describes has committed."""
+        with self._lock:
+            self._seq += 1
+            event = ChangeEvent(self._seq, kind, data, self.epoch)
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error("Change feed listener %r failed on %s: %s", listener, kind, e)
+        for subscription in subscribers:
+            subscription.deliver(event)
+        return event
+
+    def _parse(self, after: str) -> int | None:
+        # Sequence numbers restart in every process, so one from another epoch means nothing here
+        epoch, _, seq = after.rpartition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def _subscribe(self, after: str | None) -> tuple[_Subscription, list[ChangeEvent] | None]:
+        # Registering and reading the backlog under the publish lock means no
+        # event is missed or sent twice between the two
+        subscription = _Subscription(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.add(subscription)
+            if after is None:
+                return subscription, []
+            seq = self._parse(after)
+            oldest = self._history[0].seq if self._history else self._seq + 1
+            if seq is None or seq > self._seq or seq < oldest - 1:
+                return subscription, None
+            return subscription, [event for event in self._history if event.seq > seq]
+
+    def _unsubscribe(self, subscription: _Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _reset(self) -> str:
+        return ChangeEvent(self._seq, "reset", {"seq": self.position}, self.epoch).sse()
+
+    async def stream(self, after: str | None = None,
+                     heartbeat: float = HEARTBEAT_INTERVAL) -> AsyncIterator[str]:
+        """SSE text for events after the given event ID, or from now on."""
+        subscription, backlog = self._subscribe(after)
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            if backlog is None:
+                logger.info("Change feed client at %s can't resume (now at %s); sending reset", after, self.position)
+                yield self._reset()
+            else:
+                for event in backlog:
+                    yield event.sse()
+            while True:
+                if subscription.overflowed:
+                    subscription.queue = asyncio.Queue(SUBSCRIBER_BUFFER)
+                    subscription.overflowed = False
+                    yield self._reset()
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield event.sse()
+        finally:
+            self._unsubscribe(subscription)
+
+
+change_feed = ChangeFeed()
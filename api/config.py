@@ -0,0 +1,167 @@
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'enrollment.db')}"
+
+
+def env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return int(value)
+
+
+def env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return float(value)
+
+
+def normalize_database_url(url: str) -> str:
+    # Heroku-style URLs use the scheme SQLAlchemy dropped in 1.4
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+# Async driver to use for each sync URL scheme when DB_ASYNC is on
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_database_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    backend = scheme.split("+")[0]
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {scheme!r} URLs; set ASYNC_DATABASE_URL")
+    return ASYNC_DRIVERS[backend] + sep + rest
+
+
+@dataclass(frozen=True)
+class Settings:
+    database_url: str = DEFAULT_DATABASE_URL
+    db_echo: bool = False
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    # Serve the CRUD, enrollment and roster routes with AsyncSession instead of the threadpool
+    db_async: bool = False
+    async_database_url_override: str | None = None
+    # Create and upgrade tables in each worker's startup; turn off where `python -m api.migrations` runs at deploy
+    db_auto_migrate: bool = True
+    # Group commit: run create/enroll writes on one writer thread, many per transaction
+    write_queue: bool = False
+    write_queue_window_ms: float = 2.0  # how long a batch waits for more writes
+    write_queue_max_batch: int = 128
+    # Serve rosters and schedules from an in-process enrollment graph kept current by the change feed
+    enrollment_graph: bool = False
+    enrollment_graph_refresh: float = 300.0  # seconds between full reloads; bounds staleness across workers
+    # "Also took" course recommendations from a co-enrollment matrix; needs numpy and scipy
+    recommendations: bool = False
+    recommendations_refresh: float = 300.0  # seconds between full rebuilds; bounds staleness across workers
+
+    # Study tips cache: in-memory LRU, optionally backed by the app database
+    tips_cache_size: int = 1024
+    tips_cache_ttl: int = 86400  # seconds
+    tips_cache_persist: bool = False
+
+    # Serialized /students/, /courses/ and /enrollments/ pages, dropped on every write
+    list_cache_size: int = 256
+    list_cache_ttl: int = 30  # seconds; bounds staleness across workers
+
+    # Groq client used by /genai/study-tips
+    groq_model: str = "llama-3.1-8b-instant"  # also: llama-3.1-70b-versatile, mixtral-8x7b-32768, gemma-7b-it
+    groq_timeout: float = 10.0  # seconds
+    groq_connect_timeout: float = 3.0
+    groq_max_connections: int = 20
+    # Consecutive failures before falling back to local tips, and how long to stay there
+    groq_breaker_threshold: int = 5
+    groq_breaker_reset: float = 30.0
+
+    # /metrics and request instrumentation
+    metrics_response_headers: bool = False  # add Server-Timing and X-DB-Queries to every response
+    slow_request_ms: int = 1000  # log requests slower than this with their SQL; 0 turns it off
+
+    # Logging: records go through a queue to a background writer thread
+    log_level: str = "INFO"
+    log_levels: str = ""  # per-logger overrides, e.g. "api.bulk=DEBUG,sqlalchemy.engine=WARNING"
+    log_format: str = "json"  # or "text"
+    # Fraction of INFO-and-below records kept per logger; warnings and errors are never sampled
+    log_sample: str = "api.main=0.1,api.async_routes=0.1"
+
+    # Applied to every new SQLite connection
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size: int = -64000  # negative means KiB, so ~64 MB
+    sqlite_busy_timeout: int = 5000  # milliseconds
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            database_url=normalize_database_url(os.getenv("DATABASE_URL") or DEFAULT_DATABASE_URL),
+            db_echo=env_bool("DB_ECHO", cls.db_echo),
+            db_pool_size=env_int("DB_POOL_SIZE", cls.db_pool_size),
+            db_max_overflow=env_int("DB_MAX_OVERFLOW", cls.db_max_overflow),
+            db_pool_timeout=env_int("DB_POOL_TIMEOUT", cls.db_pool_timeout),
+            db_pool_recycle=env_int("DB_POOL_RECYCLE", cls.db_pool_recycle),
+            db_pool_pre_ping=env_bool("DB_POOL_PRE_PING", cls.db_pool_pre_ping),
+            db_async=env_bool("DB_ASYNC", cls.db_async),
+            async_database_url_override=os.getenv("ASYNC_DATABASE_URL") or None,
+            db_auto_migrate=env_bool("DB_AUTO_MIGRATE", cls.db_auto_migrate),
+            write_queue=env_bool("WRITE_QUEUE", cls.write_queue),
+            write_queue_window_ms=env_float("WRITE_QUEUE_WINDOW_MS", cls.write_queue_window_ms),
+            write_queue_max_batch=env_int("WRITE_QUEUE_MAX_BATCH", cls.write_queue_max_batch),
+            enrollment_graph=env_bool("ENROLLMENT_GRAPH", cls.enrollment_graph),
+            enrollment_graph_refresh=env_float("ENROLLMENT_GRAPH_REFRESH", cls.enrollment_graph_refresh),
+            recommendations=env_bool("RECOMMENDATIONS", cls.recommendations),
+            recommendations_refresh=env_float("RECOMMENDATIONS_REFRESH", cls.recommendations_refresh),
+            tips_cache_size=env_int("TIPS_CACHE_SIZE", cls.tips_cache_size),
+            tips_cache_ttl=env_int("TIPS_CACHE_TTL", cls.tips_cache_ttl),
+            tips_cache_persist=env_bool("TIPS_CACHE_PERSIST", cls.tips_cache_persist),
+            list_cache_size=env_int("LIST_CACHE_SIZE", cls.list_cache_size),
+            list_cache_ttl=env_int("LIST_CACHE_TTL", cls.list_cache_ttl),
+            groq_model=os.getenv("GROQ_MODEL", cls.groq_model),
+            groq_timeout=env_float("GROQ_TIMEOUT", cls.groq_timeout),
+            groq_connect_timeout=env_float("GROQ_CONNECT_TIMEOUT", cls.groq_connect_timeout),
+            groq_max_connections=env_int("GROQ_MAX_CONNECTIONS", cls.groq_max_connections),
+            groq_breaker_threshold=env_int("GROQ_BREAKER_THRESHOLD", cls.groq_breaker_threshold),
+            groq_breaker_reset=env_float("GROQ_BREAKER_RESET", cls.groq_breaker_reset),
+            metrics_response_headers=env_bool("METRICS_RESPONSE_HEADERS", cls.metrics_response_headers),
+            slow_request_ms=env_int("SLOW_REQUEST_MS", cls.slow_request_ms),
+            log_level=os.getenv("LOG_LEVEL", cls.log_level),
+            log_levels=os.getenv("LOG_LEVELS", cls.log_levels),
+            log_format=os.getenv("LOG_FORMAT", cls.log_format),
+            log_sample=os.getenv("LOG_SAMPLE", cls.log_sample),
+            sqlite_journal_mode=os.getenv("SQLITE_JOURNAL_MODE", cls.sqlite_journal_mode),
+            sqlite_synchronous=os.getenv("SQLITE_SYNCHRONOUS", cls.sqlite_synchronous),
+            sqlite_mmap_size=env_int("SQLITE_MMAP_SIZE", cls.sqlite_mmap_size),
+            sqlite_cache_size=env_int("SQLITE_CACHE_SIZE", cls.sqlite_cache_size),
+            sqlite_busy_timeout=env_int("SQLITE_BUSY_TIMEOUT", cls.sqlite_busy_timeout),
+        )
+
+    @property
+    def async_database_url(self) -> str:
+        return self.async_database_url_override or async_database_url(self.database_url)
+
+
+@lru_cache
+def get_settings() -> Settings:
+    load_dotenv()
+    return Settings.from_env()
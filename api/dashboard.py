@@ -0,0 +1,62 @@
+from sqlalchemy import func, select
+
+from .models import Student, Course, Enrollment
+from .schemas import CourseOut
+from .serialization import schema_columns
+
+# Any write to one of these tables changes the dashboard
+DASHBOARD_TABLES = ("students", "courses", "enrollments")
+
+
+def student_totals_statement():
+    """Every student with their enrollment count and total credit units."""
+    totals = (
+        select(
+            Enrollment.student_id,
+            func.count().label("enrolled_courses"),
+            func.sum(Course.credit_units).label("total_credit_units"),
+        )
+        .join(Course, Course.id == Enrollment.course_id)
+        .group_by(Enrollment.student_id)
+        .subquery()
+    )
+    return (
+        select(
+            Student.id,
+            Student.name,
+            Student.email,
+            func.coalesce(totals.c.enrolled_courses, 0).label("enrolled_courses"),
+            func.coalesce(totals.c.total_credit_units, 0).label("total_credit_units"),
+        )
+        .outerjoin(totals, totals.c.student_id == Student.id)
+        .order_by(Student.id)
+    )
+
+
+def courses_statement():
+    # enrolled_count is maintained by enroll/unenroll, so no GROUP BY is needed here
+    return select(*schema_columns(Course, CourseOut)).order_by(Course.id)
+
+
+def enrollment_pairs_statement():
+    return select(Enrollment.student_id, Enrollment.course_id).order_by(Enrollment.id)
+
+
+def dashboard_statements():
+    """The three queries behind /dashboard, usable with Session and AsyncSession alike."""
+    return student_totals_statement(), courses_statement(), enrollment_pairs_statement()
+
+
+def build_dashboard(student_rows, course_rows, pair_rows) -> dict:
+    """Assemble the three result sets into a DashboardOut-shaped dict, ready to encode.
+
+    The statements above already select the schema's columns, so the rows go
+    straight into plain dicts without a pydantic round trip per row.
+    """
+    pairs = [(row.student_id, row.course_id) for row in pair_rows]
+    return {
+        "students": [dict(row._mapping) for row in student_rows],
+        "courses": [dict(row._mapping) for row in course_rows],
+        "enrollments": pairs,
+        "total_enrollments": len(pairs),
+    }
@@ -1,18 +1,80 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-import os
-# Absolute path for SQLite database to avoid path issues
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'enrollment.db')}"
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+import logging
 
-print(f"Database path: {SQLALCHEMY_DATABASE_URL}")  # Debug output
+from .config import Settings, get_settings
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    echo=True  # This will show all SQL queries in console for debugging
-)
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+SQLALCHEMY_DATABASE_URL = settings.database_url
+
+def is_memory_sqlite(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+def engine_options(settings: Settings, database_url: str | None = None) -> dict:
+    url = make_url(database_url or settings.database_url)
+    options = {"echo": settings.db_echo, "pool_pre_ping": settings.db_pool_pre_ping}
+
+    if url.get_backend_name() == "sqlite":
+        # Sessions hop between threadpool workers; the busy timeout is set as a pragma below
+        options["connect_args"] = {"check_same_thread": False}
+        if is_memory_sqlite(url):
+            # Each in-memory connection is its own database, so there is nothing to pool
+            return options
+        if url.get_driver_name() == "aiosqlite":
+            # aiosqlite defaults to NullPool for files, reconnecting on every session
+            options["poolclass"] = AsyncAdaptedQueuePool
+
+    options.update(
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+    )
+    return options
+
+def sqlite_pragmas(settings: Settings) -> list[str]:
+    return [
+        # The enrollment hot path relies on foreign keys instead of looking rows up first
+        "PRAGMA foreign_keys=ON",
+        f"PRAGMA journal_mode={settings.sqlite_journal_mode}",
+        f"PRAGMA synchronous={settings.sqlite_synchronous}",
+        f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}",
+        f"PRAGMA cache_size={int(settings.sqlite_cache_size)}",
+        f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout)}",
+    ]
+
+def install_sqlite_pragmas(engine, settings: Settings):
+    if engine.dialect.name == "sqlite":
+        pragmas = sqlite_pragmas(settings)
+
+        @event.listens_for(engine, "connect")
+        def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+def create_db_engine(settings: Settings):
+    engine = create_engine(settings.database_url, **engine_options(settings))
+    install_sqlite_pragmas(engine, settings)
+    logger.info("Database: %s", engine.url.render_as_string(hide_password=True))
+    return engine
+
+def create_async_db_engine(settings: Settings):
+    async_url = settings.async_database_url
+    async_engine = create_async_engine(async_url, **engine_options(settings, async_url))
+    # Pragmas are issued through the sync facade the async engine wraps
+    install_sqlite_pragmas(async_engine.sync_engine, settings)
+    logger.info("Async database: %s", async_engine.url.render_as_string(hide_password=True))
+    return async_engine
+
+engine = create_db_engine(settings)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -22,12 +84,49 @@ Base = declarative_base()
 def get_db():
     db = SessionLocal()
     try:
-        print("Creating new database session...")  # Debug
         yield db
-    except Exception as e:
-        print(f"Database session error: {e}")  # Debug
+    except Exception:
         db.rollback()
         raise
     finally:
-        print("Closing database session...")  # Debug
-        db.close()
\ No newline at end of file
+        db.close()
+
+# The async engine is only built on first use, so the aiosqlite/asyncpg
+# drivers are not needed unless DB_ASYNC is turned on
+_async_session_factory = None
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    global _async_session_factory
+    if _async_session_factory is None:
+        _async_session_factory = async_sessionmaker(
+            create_async_db_engine(settings), expire_on_commit=False, autoflush=False
+        )
+    return _async_session_factory
+
+# Async dependency for FastAPI
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
+
+# SQLSTATE codes shared by PostgreSQL drivers
+UNIQUE_VIOLATION = "23505"
+FOREIGN_KEY_VIOLATION = "23503"
+
+def integrity_violation(error) -> str | None:
+    """Classify an IntegrityError as "unique" or "foreign_key" across drivers."""
+    orig = getattr(error, "orig", error)
+    code = getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)
+    if code == UNIQUE_VIOLATION:
+        return "unique"
+    if code == FOREIGN_KEY_VIOLATION:
+        return "foreign_key"
+    message = str(orig).lower()
+    if "unique" in message or "duplicate key" in message:
+        return "unique"
+    if "foreign key" in message:
+        return "foreign_key"
+    return None
@@ -0,0 +1,252 @@
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Callable
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .change_feed import ChangeEvent
+from .config import Settings, get_settings
+from .database import SessionLocal
+from .models import Enrollment
+
+logger = logging.getLogger(__name__)
+
+# Overlay edges tolerated before an adjacency is rebuilt into plain arrays,
+# at least this many and at least 1/COMPACT_RATIO of the edges it holds
+COMPACT_MIN = 1024
+COMPACT_RATIO = 8
+
+
+class _Adjacency:
+    """One direction of the bipartite graph in compressed sparse row form.
+
+    targets[offsets[n]:offsets[n + 1]] are node n's neighbours, ascending,
+    with node IDs as indexes: two flat integer arrays instead of a dict of
+    lists, about 12 bytes per edge. Changes since the arrays were built sit
+    in small per-node added/removed sets until there are enough to rebuild.
+    """
+
+    def __init__(self, offsets: array, targets: array):
+        self.offsets = offsets
+        self.targets = targets
+        self.added: dict[int, set[int]] = {}
+        self.removed: dict[int, set[int]] = {}
+        self.overlay = 0
+
+    @classmethod
+    def build(cls, sources: array, targets: array) -> "_Adjacency":
+        """Counting sort of the edges by source; stable, so each node's targets keep their input order."""
+        size = max(sources, default=-1) + 1
+        offsets = array("q", bytes(8 * (size + 1)))
+        for source in sources:
+            offsets[source + 1] += 1
+        for node in range(size):
+            offsets[node + 1] += offsets[node]
+        placed = array("i", bytes(4 * len(targets)))
+        cursor = offsets[:-1]
+        for source, target in zip(sources, targets):
+            placed[cursor[source]] = target
+            cursor[source] += 1
+        return cls(offsets, placed)
+
+    def _bounds(self, node: int) -> tuple[int, int]:
+        if node < 0 or node + 1 >= len(self.offsets):
+            return 0, 0
+        return self.offsets[node], self.offsets[node + 1]
+
+    def neighbours(self, node: int) -> list[int]:
+        lo, hi = self._bounds(node)
+        base = self.targets[lo:hi]
+        removed, added = self.removed.get(node), self.added.get(node)
+        if not removed and not added:
+            return base.tolist()
+        merged = [target for target in base if target not in removed] if removed else base.tolist()
+        return sorted(merged + list(added)) if added else merged
+
+    def __contains__(self, edge: tuple[int, int]) -> bool:
+        node, target = edge
+        if target in self.removed.get(node, ()):
+            return False
+        if target in self.added.get(node, ()):
+            return True
+        lo, hi = self._bounds(node)
+        i = bisect_left(self.targets, target, lo, hi)
+        return i < hi and self.targets[i] == target
+
+    def _move(self, node: int, target: int, into: dict, out_of: dict):
+        # Undo a pending opposite change if there is one, otherwise record this one
+        pending = out_of.get(node)
+        if pending and target in pending:
+            pending.discard(target)
+            if not pending:
+                del out_of[node]
+            self.overlay -= 1
+        else:
+            into.setdefault(node, set()).add(target)
+            self.overlay += 1
+
+    def add(self, node: int, target: int) -> bool:
+        if (node, target) in self:
+            return False
+        self._move(node, target, self.added, self.removed)
+        return True
+
+    def remove(self, node: int, target: int) -> bool:
+        if (node, target) not in self:
+            return False
+        self._move(node, target, self.removed, self.added)
+        return True
+
+    def needs_compaction(self) -> bool:
+        return self.overlay > max(COMPACT_MIN, len(self.targets) // COMPACT_RATIO)
+
+    def compacted(self) -> "_Adjacency":
+        sources, targets = array("i"), array("i")
+        last = max(len(self.offsets) - 2, max(self.added, default=-1))
+        for node in range(last + 1):
+            neighbours = self.neighbours(node)
+            sources.extend([node] * len(neighbours))
+            targets.extend(neighbours)
+        return _Adjacency.build(sources, targets)
+
+
+class EnrollmentGraph:
+    """In-process read model of who is enrolled in what, for roster and schedule reads.
+
+    Loaded from the enrollments table once, then kept current from the
+    change feed: every enrolled/unenrolled event is applied in place. A bulk
+    enrollment import drops the graph and reloads it in the background, and
+    so does a read once `refresh` seconds have passed since the last load,
+    which bounds how stale it can get from writes made by other processes.
+    Lookups return None while nothing is loaded, and callers then query the
+    database instead.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal, refresh: float = 300.0):
+        self.session_factory = session_factory
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._courses: _Adjacency | None = None  # student -> courses
+        self._students: _Adjacency | None = None  # course -> students
+        self._loaded_at = 0.0
+        self._pending: list | None = None  # changes seen while a load is reading the table
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "EnrollmentGraph | None":
+        if not settings.enrollment_graph:
+            return None
+        return cls(refresh=settings.enrollment_graph_refresh)
+
+    @property
+    def loaded(self) -> bool:
+        return self._courses is not None
+
+    def load(self):
+        """Build the graph from the enrollments table; safe to call while it is serving reads."""
+        with self._load_lock:
+            started = time.perf_counter()
+            with self._lock:
+                self._pending = []
+            try:
+                students, courses = array("i"), array("i")
+                with self.session_factory() as db:
+                    # unique_enrollment's index hands the pairs over already sorted
+                    result = db.execute(
+                        select(Enrollment.student_id, Enrollment.course_id)
+                        .order_by(Enrollment.student_id, Enrollment.course_id)
+                    )
+                    for student_id, course_id in result:
+                        students.append(student_id)
+                        courses.append(course_id)
+                by_student = _Adjacency.build(students, courses)
+                by_course = _Adjacency.build(courses, students)
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+
+            with self._lock:
+                # Replay what committed during the read; applying a change twice is harmless
+                for enrolled, student_id, course_id in self._pending:
+                    self._apply_edge(by_student, by_course, enrolled, student_id, course_id)
+                self._pending = None
+                self._courses, self._students = by_student, by_course
+                self._loaded_at = time.monotonic()
+            logger.info("Loaded enrollment graph: %s enrollments in %.0f ms",
+                        len(students), (time.perf_counter() - started) * 1000)
+
+    def _reload_in_background(self):
+        def reload():
+            try:
+                self.load()
+            except Exception as e:
+                logger.error("Error reloading enrollment graph: %s", e)
+
+        threading.Thread(target=reload, name="enrollment-graph", daemon=True).start()
+
+    def _maybe_refresh(self):
+        if self.refresh and self.loaded and not self._load_lock.locked() \
+                and time.monotonic() - self._loaded_at > self.refresh:
+            self._loaded_at = time.monotonic()  # one reload per period, however many readers notice
+            self._reload_in_background()
+
+    def courses_of(self, student_id: int) -> list[int] | None:
+        """IDs of the courses a student is enrolled in, ascending; None if not loaded."""
+        self._maybe_refresh()
+        with self._lock:
+            return self._courses.neighbours(student_id) if self._courses is not None else None
+
+    def students_of(self, course_id: int) -> list[int] | None:
+        """IDs of the students enrolled in a course, ascending; None if not loaded."""
+        self._maybe_refresh()
+        with self._lock:
+            return self._students.neighbours(course_id) if self._students is not None else None
+
+    @staticmethod
+    def _apply_edge(by_student: _Adjacency, by_course: _Adjacency, enrolled: bool, student_id: int, course_id: int):
+        if enrolled:
+            if by_student.add(student_id, course_id):
+                by_course.add(course_id, student_id)
+        elif by_student.remove(student_id, course_id):
+            by_course.remove(course_id, student_id)
+
+    def _update(self, enrolled: bool, student_id: int, course_id: int):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((enrolled, student_id, course_id))
+            if self._courses is None:
+                return
+            self._apply_edge(self._courses, self._students, enrolled, student_id, course_id)
+            if self._courses.needs_compaction():
+                self._courses, self._students = self._courses.compacted(), self._students.compacted()
+
+    def apply(self, event: ChangeEvent):
+        """Change feed listener."""
+        if event.kind == "enrolled":
+            self._update(True, event.data["student_id"], event.data["course_id"])
+        elif event.kind == "unenrolled":
+            self._update(False, event.data["student_id"], event.data["course_id"])
+            if event.data.get("promoted_student_id") is not None:
+                self._update(True, event.data["promoted_student_id"], event.data["course_id"])
+        elif event.kind == "bulk_imported" and event.data.get("kind") == "enrollments":
+            # Too many changes to patch, and the event doesn't list them
+            with self._lock:
+                self._courses = self._students = None
+            self._reload_in_background()
+
+
+enrollment_graph = EnrollmentGraph.from_settings(get_settings())
+
+
+def student_course_ids(student_id: int) -> list[int] | None:
+    """A student's course IDs from the graph, or None if ENROLLMENT_GRAPH is off or it isn't loaded."""
+    return enrollment_graph.courses_of(student_id) if enrollment_graph is not None else None
+
+
+def course_student_ids(course_id: int) -> list[int] | None:
+    return enrollment_graph.students_of(course_id) if enrollment_graph is not None else None
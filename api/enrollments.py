@@ -0,0 +1,146 @@
+import logging
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .database import integrity_violation
+from .models import Student, Course, Enrollment, WaitlistEntry
+
+logger = logging.getLogger(__name__)
+
+
+def claim_seats(course_id: int, seats: int = 1):
+    """UPDATE that takes seats only if the course has that many free.
+
+    Its rowcount is 1 if the seats were taken and 0 if the course is full or
+    doesn't exist. Run it in the same transaction as the Enrollment INSERT:
+    the row lock it takes makes racing enrollments queue behind each other,
+    so a section can never be oversold.
+    """
+    return (
+        update(Course)
+        .where(Course.id == course_id, or_(Course.capacity.is_(None), Course.enrolled_count + seats <= Course.capacity))
+        .values(enrolled_count=Course.enrolled_count + seats)
+    )
+
+
+def release_seat(course_id: int):
+    return update(Course).where(Course.id == course_id).values(enrolled_count=Course.enrolled_count - 1)
+
+
+def enrollment_integrity_error(db: Session, error: IntegrityError, student_id: int, course_id: int) -> HTTPException:
+    # Only reached when the INSERT was rejected, so the lookups below stay off the hot path
+    if integrity_violation(error) == "foreign_key":
+        if db.get(Student, student_id) is None:
+            return HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Student not found"
+            )
+        return HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Course not found"
+        )
+
+    logger.warning("Student %s already enrolled in course %s", student_id, course_id)
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Student already enrolled in this course"
+    )
+
+
+def join_waitlist(db: Session, student_id: int, course_id: int) -> int:
+    """Queue a student for a course claim_seats found no seat in; returns their position.
+
+    Raises 404 for an unknown student or course and 400 if the student is
+    already enrolled. Leaves committing to the caller.
+    """
+    if db.get(Student, student_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Student not found"
+        )
+    if db.get(Course, course_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Course not found"
+        )
+    enrolled = db.scalar(select(Enrollment.id).where(
+        Enrollment.student_id == student_id, Enrollment.course_id == course_id
+    ))
+    if enrolled:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Student already enrolled in this course"
+        )
+
+    entry_id = db.scalar(select(WaitlistEntry.id).where(
+        WaitlistEntry.student_id == student_id, WaitlistEntry.course_id == course_id
+    ))
+    if entry_id is None:
+        logger.info("Course %s is full, waitlisting student %s", course_id, student_id)
+        entry_id = db.execute(
+            insert(WaitlistEntry).values(student_id=student_id, course_id=course_id)
+        ).inserted_primary_key[0]
+    return db.scalar(select(func.count()).where(
+        WaitlistEntry.course_id == course_id, WaitlistEntry.id <= entry_id
+    ))
+
+
+def enroll_student(db: Session, student_id: int, course_id: int) -> int | None:
+    """Take a seat and enroll; returns the waitlist position instead if the course is full.
+
+    The foreign keys and unique_enrollment constraint do the checking, so a
+    bad pair raises IntegrityError (see enrollment_integrity_error) and rolling
+    back gives the seat back with it. Leaves committing to the caller.
+    """
+    if not db.execute(claim_seats(course_id)).rowcount:
+        # Full, or no such course; join_waitlist works out which
+        return join_waitlist(db, student_id, course_id)
+    db.execute(insert(Enrollment).values(student_id=student_id, course_id=course_id))
+    return None
+
+
+def unenroll_student(db: Session, student_id: int, course_id: int) -> int | None:
+    """Drop an enrollment and hand its seat to the head of the waitlist.
+
+    Returns the promoted student's ID, if any. Raises 404 if the student
+    wasn't enrolled. Leaves committing to the caller.
+    """
+    deleted = db.execute(delete(Enrollment).where(
+        Enrollment.student_id == student_id, Enrollment.course_id == course_id
+    )).rowcount
+    if not deleted:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Enrollment not found"
+        )
+
+    head = db.execute(
+        select(WaitlistEntry.id, WaitlistEntry.student_id)
+        .where(WaitlistEntry.course_id == course_id)
+        .order_by(WaitlistEntry.id)
+        .limit(1)
+        .with_for_update()
+    ).first()
+    if head is None:
+        db.execute(release_seat(course_id))
+        return None
+
+    # The freed seat passes straight to the next student, so enrolled_count is unchanged
+    db.execute(delete(WaitlistEntry).where(WaitlistEntry.id == head.id))
+    db.execute(insert(Enrollment).values(student_id=head.student_id, course_id=course_id))
+    logger.info("Promoted student %s from the waitlist of course %s", head.student_id, course_id)
+    return head.student_id
+
+
+def waitlisted_students(db: Session, course_id: int) -> list[Student]:
+    if db.get(Course, course_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Course not found"
+        )
+    return list(db.scalars(
+        select(Student).join(WaitlistEntry).where(WaitlistEntry.course_id == course_id).order_by(WaitlistEntry.id)
+    ))
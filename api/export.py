@@ -0,0 +1,270 @@
+import argparse
+import csv
+import io
+import logging
+import sys
+import zlib
+from dataclasses import dataclass
+from importlib.util import find_spec
+from typing import Callable, Iterable, Iterator
+
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Integer, select
+
+from .database import SessionLocal
+from .models import Student, Course, Enrollment
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip from the server-side cursor; also one Parquet row group
+EXPORT_CHUNK_SIZE = 50_000
+GZIP_LEVEL = 6
+
+EXPORT_FORMATS = ("csv", "parquet")
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "csv.gz": "application/gzip",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+_STUDENT_COLUMNS = (
+    Student.id.label("student_id"), Student.name.label("student_name"), Student.email.label("student_email"),
+)
+_COURSE_COLUMNS = (
+    Course.id.label("course_id"), Course.code.label("course_code"), Course.title.label("course_title"),
+    Course.credit_units,
+)
+
+
+def _enrollment_join(*columns):
+    return (
+        select(*columns)
+        .select_from(Enrollment)
+        .join(Student, Student.id == Enrollment.student_id)
+        .join(Course, Course.id == Enrollment.course_id)
+    )
+
+
+def roster_statement():
+    # Every course's students, course by course
+    return _enrollment_join(*_COURSE_COLUMNS, *_STUDENT_COLUMNS).order_by(Enrollment.course_id, Enrollment.student_id)
+
+
+def transcript_statement():
+    # Every student's courses, student by student; with_credit_totals adds the totals
+    return _enrollment_join(*_STUDENT_COLUMNS, *_COURSE_COLUMNS).order_by(Enrollment.student_id, Enrollment.course_id)
+
+
+def enrollment_statement():
+    return _enrollment_join(Enrollment.id.label("enrollment_id"), *_STUDENT_COLUMNS, *_COURSE_COLUMNS).order_by(
+        Enrollment.id
+    )
+
+
+def with_credit_totals(chunks: Iterable[list]) -> Iterator[list]:
+    """Append each student's credit_units total to their rows.
+
+    Rows arrive grouped by student, so only the current student's rows are
+    held back until their total is known. A SUM() OVER window would make the
+    database sort the whole join before sending the first row.
+    """
+    pending, total, current = [], 0, None
+    for rows in chunks:
+        ready = []
+        for row in rows:
+            if row.student_id != current:
+                ready.extend(values + (total,) for values in pending)
+                pending, total, current = [], 0, row.student_id
+            pending.append(tuple(row))
+            total += row.credit_units
+        if ready:
+            yield ready
+    if pending:
+        yield [values + (total,) for values in pending]
+
+
+@dataclass(frozen=True)
+class Export:
+    statement: Callable
+    # Applied to the stream of row chunks, appending the integer columns named in added
+    transform: Callable[[Iterable[list]], Iterator[list]] | None = None
+    added: tuple[str, ...] = ()
+
+
+EXPORTS = {
+    "roster": Export(roster_statement),
+    "transcripts": Export(transcript_statement, with_credit_totals, ("total_credit_units",)),
+    "enrollments": Export(enrollment_statement),
+}
+
+
+def export_statement(kind: str, course_id: int | None = None, student_id: int | None = None):
+    stmt = EXPORTS[kind].statement()
+    if course_id is not None:
+        stmt = stmt.where(Enrollment.course_id == course_id)
+    if student_id is not None:
+        stmt = stmt.where(Enrollment.student_id == student_id)
+    return stmt
+
+
+def iter_export_chunks(stmt, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[list]:
+    """Run stmt on a server-side cursor, yielding chunk_size rows at a time.
+
+    Only one chunk is held in memory however large the export. Uses its own
+    session, like iter_keyset_chunks, since a StreamingResponse body outlives
+    the request's.
+    """
+    with SessionLocal() as db:
+        result = db.connection().execution_options(yield_per=chunk_size).execute(stmt)
+        yield from result.partitions()
+
+
+def export_columns(kind: str, stmt) -> list[tuple[str, bool]]:
+    """(name, is_integer) for each column of an export."""
+    selected = [(column.key, isinstance(column.type, Integer)) for column in stmt.selected_columns]
+    return selected + [(name, True) for name in EXPORTS[kind].added]
+
+
+def csv_chunks(columns: list[tuple[str, bool]], chunks: Iterable[list]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()  # just the header: nothing matched
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = GZIP_LEVEL) -> Iterator[bytes]:
+    """Compress a byte stream into one gzip member as it goes."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class _Drain(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain()."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def parquet_available() -> bool:
+    return find_spec("pyarrow") is not None
+
+
+def parquet_chunks(columns: list[tuple[str, bool]], chunks: Iterable[list],
+                   compression: str = "snappy") -> Iterator[bytes]:
+    """Parquet with one row group per chunk, sent as each row group is written."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(name, pa.int64() if is_integer else pa.string()) for name, is_integer in columns])
+    sink = _Drain()
+    with pq.ParquetWriter(sink, schema, compression=compression) as writer:
+        for rows in chunks:
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)], schema=schema
+            ))
+            yield sink.drain()
+    yield sink.drain()  # the footer
+
+
+def export_chunks(kind: str, fmt: str, gzip: bool = False, course_id: int | None = None,
+                  student_id: int | None = None, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """An export as a stream of bytes; used by both the HTTP endpoint and the CLI.
+
+    gzip compresses CSV as a whole, and Parquet column by column (its own codec).
+    """
+    stmt = export_statement(kind, course_id, student_id)
+    columns = export_columns(kind, stmt)
+    rows = iter_export_chunks(stmt, chunk_size)
+    if EXPORTS[kind].transform is not None:
+        rows = EXPORTS[kind].transform(rows)
+    if fmt == "parquet":
+        return parquet_chunks(columns, rows, compression="gzip" if gzip else "snappy")
+    chunks = csv_chunks(columns, rows)
+    return gzip_chunks(chunks) if gzip else chunks
+
+
+def export_response(kind: str, fmt: str, gzip: bool = False, course_id: int | None = None,
+                    student_id: int | None = None) -> StreamingResponse:
+    # Everything that can fail is checked before the body, and its 200, start streaming
+    if kind not in EXPORTS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown export {kind!r}; choose from {', '.join(EXPORTS)}"
+        )
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported format {fmt!r}; use one of {', '.join(EXPORT_FORMATS)}"
+        )
+    if fmt == "parquet" and not parquet_available():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Parquet export needs pyarrow installed"
+        )
+
+    extension = "csv.gz" if fmt == "csv" and gzip else fmt
+    logger.info("Exporting %s as %s", kind, extension)
+    return StreamingResponse(
+        export_chunks(kind, fmt, gzip, course_id, student_id),
+        media_type=MEDIA_TYPES[extension],
+        headers={"Content-Disposition": f'attachment; filename="{kind}.{extension}"'}
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export rosters, transcripts or enrollments as CSV or Parquet")
+    parser.add_argument("kind", choices=list(EXPORTS))
+    parser.add_argument("-o", "--output", default="-", help="File to write, or - for stdout")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="Defaults to the output file extension, else csv")
+    parser.add_argument("--gzip", action="store_true", help="Implied by a .gz output file")
+    parser.add_argument("--course-id", type=int, help="Only this course's enrollments")
+    parser.add_argument("--student-id", type=int, help="Only this student's enrollments")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    output = args.output.lower()
+    fmt = args.format or ("parquet" if output.endswith(".parquet") else "csv")
+    gzip = args.gzip or output.endswith(".gz")
+    chunks = export_chunks(args.kind, fmt, gzip, args.course_id, args.student_id, args.chunk_size)
+
+    if args.output == "-":
+        for chunk in chunks:
+            sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
+    else:
+        with open(args.output, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import AsyncIterator
+
+from .config import get_settings
+from .schemas import TipsRequest
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling Groq while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Stops calling a failing upstream for a cool-down period.
+
+    After `failure_threshold` consecutive failures the breaker opens and every
+    call is refused until `reset_timeout` has passed; then a single trial call
+    is let through, closing the breaker again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_abandoned(self):
+        # The call was cancelled before it could succeed or fail; let another trial through
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+breaker = CircuitBreaker(settings.groq_breaker_threshold, settings.groq_breaker_reset)
+
+_client = None
+
+
+def get_api_key() -> str | None:
+    return os.getenv("GROQ_API_KEY")
+
+
+def get_client():
+    """One AsyncGroq client per process, so connections are pooled and kept alive."""
+    global _client
+    if _client is None:
+        # Imported here so the SDK and its HTTP stack are only loaded once GenAI
+        # is actually used, keeping them off every worker's cold start
+        import httpx
+        from groq import AsyncGroq
+
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.groq_max_connections,
+                max_keepalive_connections=settings.groq_max_connections,
+            ),
+        )
+        _client = AsyncGroq(
+            api_key=get_api_key(),
+            http_client=http_client,
+            timeout=httpx.Timeout(settings.groq_timeout, connect=settings.groq_connect_timeout),
+            # Retrying a slow upstream only makes the caller wait longer; the breaker handles it
+            max_retries=0,
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def build_prompt(request: TipsRequest) -> list[dict]:
+    prompt = f"Generate 3-5 practical study tips for a {request.credit_units}-credit course called '{request.course_title}'. Focus on time management, study techniques, and resource utilization. Keep tips concise and actionable."
+    return [{"role": "user", "content": prompt}]
+
+
+def parse_tip(line: str) -> str | None:
+    line = line.strip()
+    if line and len(line) > 10:  # Only include substantial lines
+        # Remove numbering and bullet points
+        clean_tip = line.lstrip('123456789.-*• ').strip()
+        if clean_tip:
+            return clean_tip
+    return None
+
+
+def pad_tips(request: TipsRequest, tips: list[str]) -> list[str]:
+    # Ensure we have at least 3 tips
+    if len(tips) < 3:
+        tips = tips + [
+            f"Review {request.course_title} materials weekly",
+            "Practice with real-world examples",
+            "Form study groups for better understanding"
+        ]
+    return tips[:5]  # Return max 5 tips
+
+
+def mock_tips(request: TipsRequest) -> list[str]:
+    # Used when no GROQ_API_KEY is configured
+    return [
+        f"Study {request.course_title} for {request.credit_units} hours weekly",
+        "Create flashcards for key concepts",
+        "Practice with past exam papers",
+        "Join online forums related to the subject",
+        "Set specific weekly learning goals"
+    ]
+
+
+def fallback_tips(request: TipsRequest) -> list[str]:
+    # Used when Groq fails, times out, or the breaker is open
+    fallback_tips = [
+        f"Allocate {request.credit_units} hours per week for {request.course_title}",
+        "Create a study schedule and stick to it consistently",
+        "Break complex topics into smaller, manageable sections",
+        "Use active recall by testing yourself without notes",
+        "Create visual aids like mind maps and diagrams",
+        "Form study groups to discuss difficult concepts",
+        "Practice with past exams and timed exercises",
+        "Teach the material to someone else to reinforce learning",
+        "Use multiple resources - textbooks, videos, and online tutorials",
+        "Review notes within 24 hours of each study session"
+    ]
+    # Return 5 high-quality, relevant tips
+    return random.sample(fallback_tips, min(5, len(fallback_tips)))
+
+
+async def generate_tips(request: TipsRequest) -> list[str]:
+    """Ask Groq for tips; raises if the call fails or the breaker is open."""
+    if not breaker.allow():
+        raise UpstreamUnavailable("Groq circuit breaker is open")
+
+    logger.info("Sending request to Groq API for course: %s", request.course_title)
+    try:
+        chat_completion = await get_client().chat.completions.create(
+            messages=build_prompt(request),
+            model=settings.groq_model,
+            temperature=0.7,
+            max_tokens=300,
+            top_p=1,
+            stream=False,
+        )
+    except asyncio.CancelledError:
+        breaker.record_abandoned()
+        raise
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+
+    response_content = chat_completion.choices[0].message.content or ""
+    tips = [tip for tip in map(parse_tip, response_content.strip().split('\n')) if tip]
+    return pad_tips(request, tips)
+
+
+async def stream_tips(request: TipsRequest) -> AsyncIterator[str]:
+    """Yield tips one by one as Groq streams them; raises like generate_tips."""
+    if not breaker.allow():
+        raise UpstreamUnavailable("Groq circuit breaker is open")
+
+    logger.info("Streaming Groq API tips for course: %s", request.course_title)
+    finished = False
+    try:
+        stream = await get_client().chat.completions.create(
+            messages=build_prompt(request),
+            model=settings.groq_model,
+            temperature=0.7,
+            max_tokens=300,
+            top_p=1,
+            stream=True,
+        )
+        buffer = ""
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            buffer += chunk.choices[0].delta.content or ""
+            # A tip is complete once its line ends
+            while "\n" in buffer:
+                line, buffer = buffer.split("\n", 1)
+                tip = parse_tip(line)
+                if tip:
+                    yield tip
+        tip = parse_tip(buffer)
+        if tip:
+            yield tip
+        finished = True
+    except Exception:
+        finished = True
+        breaker.record_failure()
+        raise
+    finally:
+        if not finished:
+            # Client went away mid-stream; that says nothing about Groq's health
+            breaker.record_abandoned()
+    breaker.record_success()
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,147 @@
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from datetime import datetime, timezone
+
+from .config import Settings
+
+# Log arguments safe to interpolate later on the writer thread: immutable, and
+# rendering them runs no application code
+_DEFERRABLE_ARGS = (str, int, float, bytes, type(None))
+
+# LogRecord attributes that aren't user-supplied `extra` fields
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+def parse_pairs(text: str) -> dict[str, str]:
+    """Parse "name=value,name=value" settings such as LOG_LEVELS and LOG_SAMPLE."""
+    pairs = {}
+    for item in text.split(","):
+        name, sep, value = item.partition("=")
+        if sep and name.strip():
+            pairs[name.strip()] = value.strip()
+    return pairs
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any `extra` fields passed to the log call."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps one in every 1/rate INFO-and-below records from the configured loggers.
+
+    Deterministic rather than random, so a steady stream of events is thinned
+    evenly. Kept records carry `sample_rate` so counts can be scaled back up.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = {name: rate for name, rate in rates.items() if rate < 1}
+        self._counters = {name: itertools.count() for name in self.rates}
+        self._resolved: dict[str, str | None] = {}
+
+    def _configured_name(self, logger_name: str) -> str | None:
+        # "api.main" also covers "api.main.anything", like logger levels do
+        if logger_name not in self._resolved:
+            name = logger_name
+            while name and name not in self.rates:
+                name = name.rpartition(".")[0]
+            self._resolved[logger_name] = name or None
+        return self._resolved[logger_name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        name = self._configured_name(record.name)
+        if name is None:
+            return True
+        rate = self.rates[name]
+        if rate <= 0:
+            return False
+        # next() on itertools.count is atomic under the GIL, so no lock is needed
+        if next(self._counters[name]) % round(1 / rate):
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the writer thread without formatting them first.
+
+    The stock QueueHandler renders the message on the calling thread so the
+    record can be pickled; ours never leaves the process, so when every
+    argument is an immutable primitive, message interpolation and JSON
+    encoding happen on the writer thread instead. Any other argument (a
+    dict, a model, an ORM instance) could change or lazy-load from another
+    thread's session by then, so those messages are rendered here.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if args and not (isinstance(args, tuple) and all(isinstance(arg, _DEFERRABLE_ARGS) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+_listener: logging.handlers.QueueListener | None = None
+_handler: DeferredQueueHandler | None = None
+
+
+def configure_logging(settings: Settings, stream=None):
+    """Route all logging through a queue to a background writer; safe to call again."""
+    global _listener, _handler
+    stop_logging()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    if settings.log_format == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    handler = DeferredQueueHandler(queue.SimpleQueue())
+    rates = {name: float(rate) for name, rate in parse_pairs(settings.log_sample).items()}
+    if rates:
+        handler.addFilter(SamplingFilter(rates))
+
+    root = logging.getLogger()
+    if _handler is not None:
+        root.removeHandler(_handler)
+    root.addHandler(handler)
+    _handler = handler
+    root.setLevel(settings.log_level.upper())
+    for name, level in parse_pairs(settings.log_levels).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(handler.queue, output)
+    _listener.start()
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -1,31 +1,80 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from contextlib import asynccontextmanager
+
+from fastapi import APIRouter, FastAPI, Depends, Header, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from dotenv import load_dotenv
-import os
-from groq import Groq
 import logging
 
-from .database import SessionLocal, engine, Base, get_db
+from .config import get_settings
+from .log_config import configure_logging
+from .database import SessionLocal, engine, get_db
 from .models import Student, Course, Enrollment
-from .schemas import StudentCreate, StudentOut, CourseCreate, CourseOut, EnrollCreate, TipsRequest
-
-logging.basicConfig(level=logging.INFO)
+from .schemas import (
+    StudentCreate, StudentOut, CourseCreate, CourseOut, EnrollCreate, EnrollmentOut, TipsRequest, BulkImportResult,
+    EnrollBatch, EnrollBatchResult, DashboardOut, CourseRecommendation
+)
+from .enrollments import enroll_student, enrollment_integrity_error, unenroll_student, waitlisted_students
+from .writes import insert_student, insert_course
+from .write_queue import run_write, write_coordinator
+from .change_feed import CHANGE_SEQ_HEADER, change_feed
+from .enrollment_graph import course_student_ids, enrollment_graph, student_course_ids
+from .recommendations import RECOMMENDATION_COUNT, TOP_K, co_enrollment, recommended_courses
+from .migrations import migrate
+from .metrics import PROMETHEUS_MEDIA_TYPE, MetricsMiddleware, registry
+from .lookups import (
+    Expand, batch_ids, batch_statement, expanded_statement, expanded_tables, in_request_order, serialize_expanded
+)
+from .search import SEARCH_PAGE_SIZE, MAX_SEARCH_PAGE_SIZE, search_statement
+from .dashboard import DASHBOARD_TABLES, dashboard_statements, build_dashboard
+from .bulk import FORMATS, enroll_pairs, format_from_content_type, import_file, spool_request_body
+from .export import export_response
+from . import genai
+from .tips_cache import TipsCache
+from .pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, keyset_statement, next_cursor_headers, ndjson_response
+from .read_cache import JSON_MEDIA_TYPE, list_cache, table_versions, conditional_response
+from .serialization import FastJSONResponse, dumps, serialize_rows
+
+settings = get_settings()
+configure_logging(settings)
 logger = logging.getLogger(__name__)
-
-load_dotenv()
-
-try:
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database tables created successfully")
-except Exception as e:
-    logger.error(f"Error creating database tables: {e}")
+tips_cache = TipsCache.from_settings(settings)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema work runs once per worker at startup rather than on import, so
+    # importing the app (tests, tooling, the startup report) never touches the database
+    if settings.db_auto_migrate:
+        try:
+            await run_in_threadpool(migrate, engine)
+        except Exception as e:
+            logger.error("Error creating database tables: %s", e)
+    if enrollment_graph is not None:
+        # Listen first, so changes committed while the table is read are replayed
+        change_feed.add_listener(enrollment_graph.apply)
+        try:
+            await run_in_threadpool(enrollment_graph.load)
+        except Exception as e:
+            logger.error("Error loading enrollment graph, rosters will be read from the database: %s", e)
+    if co_enrollment is not None:
+        change_feed.add_listener(co_enrollment.apply)
+        co_enrollment.start()  # builds in the background; recommendations answer 503 until then
+    yield
+    if co_enrollment is not None:
+        await run_in_threadpool(co_enrollment.stop)
+    if write_coordinator is not None:
+        # Let queued writes commit before the worker exits
+        await run_in_threadpool(write_coordinator.stop)
+    await genai.close_client()
 
 app = FastAPI(
     title="Course Enrollment API",
     description="A comprehensive API for managing students, courses, and enrollments",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -41,8 +90,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, CHANGE_SEQ_HEADER, "ETag", "Server-Timing", "X-DB-Queries"],
+)
+
+app.add_middleware(
+    MetricsMiddleware,
+    response_headers=settings.metrics_response_headers,
+    slow_request_seconds=settings.slow_request_ms / 1000 if settings.slow_request_ms > 0 else None,
 )
 
+# Routes backed by the sync Session; swapped for their AsyncSession twins in
+# async_routes.py when DB_ASYNC is on. Mounted at the bottom of this module.
+db_router = APIRouter()
+
 @app.get("/")
 async def root():
     return {
@@ -52,6 +112,10 @@ async def root():
             "students": "/students",
             "courses": "/courses",
             "enrollments": "/enroll",
+            "dashboard": "/dashboard",
+            "search": "/courses/search",
+            "export": "/export/{roster,transcripts,enrollments}",
+            "events": "/events",
             "docs": "/docs"
         }
     }
@@ -60,56 +124,106 @@ async def root():
 async def health_check():
     return {"status": "healthy", "message": "API is running successfully"}
 
-@app.post("/students/", response_model=StudentOut, status_code=status.HTTP_201_CREATED)
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(registry.render(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+@app.get("/events")
+async def events(
+    after: str | None = Query(None, description="Event ID to resume after, e.g. a dashboard's X-Change-Seq"),
+    last_event_id: str | None = Header(None),
+):
+    # Server-Sent Events: one compact event per committed change, so the UI can
+    # patch its state instead of polling. A reconnecting EventSource sends
+    # Last-Event-ID itself, which takes precedence over ?after=
+    if last_event_id:
+        after = last_event_id
+    return StreamingResponse(
+        change_feed.stream(after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@db_router.post("/students/", response_model=StudentOut, status_code=status.HTTP_201_CREATED)
 def create_student(student: StudentCreate, db: Session = Depends(get_db)):
     try:
-        logger.info(f"Creating student: {student.name} ({student.email})")
-
-        existing_student = db.query(Student).filter(Student.email == student.email).first()
-        if existing_student:
-            logger.warning(f"Student with email {student.email} already exists")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Student with this email already exists"
-            )
+        logger.info("Creating student: %s (%s)", student.name, student.email)
 
-        db_student = Student(**student.model_dump())
-        db.add(db_student)
-        db.commit()
-        db.refresh(db_student)
+        created = run_write(db, insert_student, student)
+        table_versions.bump("students")
+        change_feed.publish("student_created", created.model_dump())
 
-        logger.info(f"Student created successfully with ID: {db_student.id}")
-        return db_student
+        logger.info("Student created successfully with ID: %s", created.id)
+        return created
 
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
-        logger.error(f"Error creating student: {str(e)}")
+        logger.error("Error creating student: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create student: {str(e)}"
         )
 
-@app.get("/students/", response_model=list[StudentOut])
-def get_students(db: Session = Depends(get_db)):
+@db_router.get("/students/", response_model=list[StudentOut])
+def get_students(
+    request: Request,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: int | None = Query(None, ge=0),
+    stream: bool = False,
+    expand: tuple[str, ...] = Depends(Expand(Student)),
+    db: Session = Depends(get_db)
+):
+    if stream and expand:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="expand is not supported with stream"
+        )
     try:
-        students = db.query(Student).all()
-        logger.info(f"Retrieved {len(students)} students")
-        return students
+        if stream:
+            return ndjson_response(Student, StudentOut, after=after, limit=limit)
+
+        def build():
+            if expand:
+                # Related rows come back in the same round trips as the page, not one query per row
+                students = db.scalars(expanded_statement(Student, expand, after, limit)).all()
+                body = serialize_expanded(Student, StudentOut, students, expand)
+            else:
+                students = db.execute(keyset_statement(Student, after, limit, StudentOut)).all()
+                body = serialize_rows(students)
+            logger.info("Retrieved %s students", len(students))
+            return body, next_cursor_headers(students, limit)
+
+        # Served from memory, or as a bodiless 304, until the next write to students
+        return conditional_response(request, list_cache.get_or_build(expanded_tables(Student, expand), (after, limit, expand), build))
+    except Exception as e:
+        logger.error("Error retrieving students: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve students"
+        )
+
+# Registered before /students/{student_id} so "batch" isn't parsed as an ID
+@db_router.get("/students/batch", response_model=list[StudentOut])
+def get_students_batch(ids: list[int] = Depends(batch_ids), db: Session = Depends(get_db)):
+    try:
+        rows = db.execute(batch_statement(Student, StudentOut, ids)).all()
+        logger.info("Resolved %s of %s students", len(rows), len(ids))
+        return Response(content=serialize_rows(in_request_order(rows, ids)), media_type=JSON_MEDIA_TYPE)
     except Exception as e:
-        logger.error(f"Error retrieving students: {str(e)}")
+        logger.error("Error resolving students batch: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to retrieve students"
         )
 
-@app.get("/students/{student_id}", response_model=StudentOut)
+@db_router.get("/students/{student_id}", response_model=StudentOut)
 def get_student(student_id: int, db: Session = Depends(get_db)):
     try:
         student = db.query(Student).filter(Student.id == student_id).first()
         if not student:
-            logger.warning(f"Student with ID {student_id} not found")
+            logger.warning("Student with ID %s not found", student_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Student not found"
@@ -118,62 +232,112 @@ def get_student(student_id: int, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error retrieving student {student_id}: {str(e)}")
+        logger.error("Error retrieving student %s: %s", student_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to retrieve student"
         )
 
-@app.post("/courses/", response_model=CourseOut, status_code=status.HTTP_201_CREATED)
+@db_router.post("/courses/", response_model=CourseOut, status_code=status.HTTP_201_CREATED)
 def create_course(course: CourseCreate, db: Session = Depends(get_db)):
     try:
-        logger.info(f"Creating course: {course.title} ({course.code})")
+        logger.info("Creating course: %s (%s)", course.title, course.code)
 
-        existing_course = db.query(Course).filter(Course.code == course.code).first()
-        if existing_course:
-            logger.warning(f"Course with code {course.code} already exists")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Course with this code already exists"
-            )
+        created = run_write(db, insert_course, course)
+        table_versions.bump("courses")
+        change_feed.publish("course_created", created.model_dump())
 
-        db_course = Course(**course.model_dump())
-        db.add(db_course)
-        db.commit()
-        db.refresh(db_course)
-
-        logger.info(f"Course created successfully with ID: {db_course.id}")
-        return db_course
+        logger.info("Course created successfully with ID: %s", created.id)
+        return created
 
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
-        logger.error(f"Error creating course: {str(e)}")
+        logger.error("Error creating course: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create course: {str(e)}"
         )
 
-@app.get("/courses/", response_model=list[CourseOut])
-def get_courses(db: Session = Depends(get_db)):
+@db_router.get("/courses/", response_model=list[CourseOut])
+def get_courses(
+    request: Request,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: int | None = Query(None, ge=0),
+    stream: bool = False,
+    expand: tuple[str, ...] = Depends(Expand(Course)),
+    db: Session = Depends(get_db)
+):
+    if stream and expand:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="expand is not supported with stream"
+        )
     try:
-        courses = db.query(Course).all()
-        logger.info(f"Retrieved {len(courses)} courses")
-        return courses
+        if stream:
+            return ndjson_response(Course, CourseOut, after=after, limit=limit)
+
+        def build():
+            if expand:
+                # Related rows come back in the same round trips as the page, not one query per row
+                courses = db.scalars(expanded_statement(Course, expand, after, limit)).all()
+                body = serialize_expanded(Course, CourseOut, courses, expand)
+            else:
+                courses = db.execute(keyset_statement(Course, after, limit, CourseOut)).all()
+                body = serialize_rows(courses)
+            logger.info("Retrieved %s courses", len(courses))
+            return body, next_cursor_headers(courses, limit)
+
+        return conditional_response(request, list_cache.get_or_build(expanded_tables(Course, expand), (after, limit, expand), build))
     except Exception as e:
-        logger.error(f"Error retrieving courses: {str(e)}")
+        logger.error("Error retrieving courses: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to retrieve courses"
         )
 
-@app.get("/courses/{course_id}", response_model=CourseOut)
+# Registered before /courses/{course_id} so "batch" isn't parsed as an ID
+@db_router.get("/courses/batch", response_model=list[CourseOut])
+def get_courses_batch(ids: list[int] = Depends(batch_ids), db: Session = Depends(get_db)):
+    try:
+        rows = db.execute(batch_statement(Course, CourseOut, ids)).all()
+        logger.info("Resolved %s of %s courses", len(rows), len(ids))
+        return Response(content=serialize_rows(in_request_order(rows, ids)), media_type=JSON_MEDIA_TYPE)
+    except Exception as e:
+        logger.error("Error resolving courses batch: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve courses"
+        )
+
+# Registered before /courses/{course_id} so "search" isn't parsed as an ID
+@db_router.get("/courses/search", response_model=list[CourseOut])
+def search_courses(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=MAX_SEARCH_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
+    try:
+        stmt = search_statement(db.get_bind().dialect.name, q, limit, offset)
+        if stmt is None:
+            return []
+        courses = db.scalars(stmt).all()
+        logger.info("Search %r matched %s courses", q, len(courses))
+        return courses
+    except Exception as e:
+        logger.error("Error searching courses: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to search courses"
+        )
+
+@db_router.get("/courses/{course_id}", response_model=CourseOut)
 def get_course(course_id: int, db: Session = Depends(get_db)):
     try:
         course = db.query(Course).filter(Course.id == course_id).first()
         if not course:
-            logger.warning(f"Course with ID {course_id} not found")
+            logger.warning("Course with ID %s not found", course_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Course not found"
@@ -182,237 +346,367 @@ def get_course(course_id: int, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error retrieving course {course_id}: {str(e)}")
+        logger.error("Error retrieving course %s: %s", course_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to retrieve course"
         )
 
-@app.post("/enroll/", status_code=status.HTTP_201_CREATED)
+@db_router.post("/enroll/", status_code=status.HTTP_201_CREATED)
 def enroll(enroll: EnrollCreate, db: Session = Depends(get_db)):
     try:
-        logger.info(f"Enrolling student {enroll.student_id} in course {enroll.course_id}")
+        logger.info("Enrolling student %s in course %s", enroll.student_id, enroll.course_id)
 
-        student = db.query(Student).filter(Student.id == enroll.student_id).first()
-        if not student:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Student not found"
-            )
-
-        course = db.query(Course).filter(Course.id == enroll.course_id).first()
-        if not course:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Course not found"
-            )
-
-        existing_enrollment = db.query(Enrollment).filter(
-            Enrollment.student_id == enroll.student_id,
-            Enrollment.course_id == enroll.course_id
-        ).first()
-
-        if existing_enrollment:
-            logger.warning(f"Student {enroll.student_id} already enrolled in course {enroll.course_id}")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Student already enrolled in this course"
-            )
+        position = run_write(db, enroll_student, enroll.student_id, enroll.course_id)
+        if position is not None:
+            change_feed.publish("waitlisted", {
+                "student_id": enroll.student_id, "course_id": enroll.course_id, "position": position
+            })
+            return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={
+                "message": "Course is full; added to the waitlist",
+                "student_id": enroll.student_id,
+                "course_id": enroll.course_id,
+                "waitlist_position": position
+            })
 
-        db_enroll = Enrollment(**enroll.model_dump())
-        db.add(db_enroll)
-        db.commit()
+        table_versions.bump("enrollments", "courses")
+        change_feed.publish("enrolled", {"student_id": enroll.student_id, "course_id": enroll.course_id})
 
-        logger.info(f"Enrollment successful: student {enroll.student_id} in course {enroll.course_id}")
+        logger.info("Enrollment successful: student %s in course %s", enroll.student_id, enroll.course_id)
         return {
             "message": "Enrolled successfully",
             "student_id": enroll.student_id,
             "course_id": enroll.course_id
         }
 
-    except IntegrityError:
-        db.rollback()
-        logger.error("Integrity error during enrollment")
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Student already enrolled in this course"
-        )
     except HTTPException:
-        db.rollback()
         raise
+    except IntegrityError as e:
+        raise enrollment_integrity_error(db, e, enroll.student_id, enroll.course_id)
     except Exception as e:
-        db.rollback()
-        logger.error(f"Error during enrollment: {str(e)}")
+        logger.error("Error during enrollment: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to enroll student: {str(e)}"
         )
 
-@app.get("/enrollments/")
-def get_enrollments(db: Session = Depends(get_db)):
+@db_router.post("/enroll/batch", response_model=EnrollBatchResult)
+def enroll_batch(batch: EnrollBatch, db: Session = Depends(get_db)):
+    try:
+        pairs = batch.pairs()
+        logger.info("Batch enrolling %s student/course pairs", len(pairs))
+
+        results = run_write(db, enroll_pairs, pairs)
+        enrolled = sum(1 for r in results if r.status == "enrolled")
+        if enrolled:
+            table_versions.bump("enrollments", "courses")
+        for r in results:
+            if r.status == "enrolled":
+                change_feed.publish("enrolled", {"student_id": r.student_id, "course_id": r.course_id})
+
+        logger.info("Batch enrollment finished: %s of %s enrolled", enrolled, len(pairs))
+        return EnrollBatchResult(enrolled=enrolled, failed=len(results) - enrolled, results=results)
+
+    except Exception as e:
+        db.rollback()
+        logger.error("Error during batch enrollment: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to enroll students: {str(e)}"
+        )
+
+@db_router.get("/enrollments/", response_model=list[EnrollmentOut])
+def get_enrollments(
+    request: Request,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: int | None = Query(None, ge=0),
+    stream: bool = False,
+    expand: tuple[str, ...] = Depends(Expand(Enrollment)),
+    db: Session = Depends(get_db)
+):
+    if stream and expand:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="expand is not supported with stream"
+        )
     try:
-        enrollments = db.query(Enrollment).all()
-        return enrollments
+        if stream:
+            return ndjson_response(Enrollment, EnrollmentOut, after=after, limit=limit)
+
+        def build():
+            if expand:
+                # Related rows come back in the same round trips as the page, not one query per row
+                enrollments = db.scalars(expanded_statement(Enrollment, expand, after, limit)).all()
+                body = serialize_expanded(Enrollment, EnrollmentOut, enrollments, expand)
+            else:
+                enrollments = db.execute(keyset_statement(Enrollment, after, limit, EnrollmentOut)).all()
+                body = serialize_rows(enrollments)
+            logger.info("Retrieved %s enrollments", len(enrollments))
+            return body, next_cursor_headers(enrollments, limit)
+
+        return conditional_response(request, list_cache.get_or_build(expanded_tables(Enrollment, expand), (after, limit, expand), build))
     except Exception as e:
-        logger.error(f"Error retrieving enrollments: {str(e)}")
+        logger.error("Error retrieving enrollments: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to retrieve enrollments"
         )
 
-@app.get("/students/{student_id}/courses/", response_model=list[CourseOut])
+@db_router.get("/dashboard", response_model=DashboardOut)
+def get_dashboard(request: Request, db: Session = Depends(get_db)):
+    try:
+        def build():
+            # Read first: the snapshot then holds at least every change up to
+            # this event, so a client can follow /events?after= it without gaps
+            position = change_feed.position
+            # Three aggregate queries however many students and courses there are
+            dashboard = build_dashboard(*(db.execute(stmt).all() for stmt in dashboard_statements()))
+            logger.info("Built dashboard: %s students, %s courses", len(dashboard["students"]), len(dashboard["courses"]))
+            return dumps(dashboard), {CHANGE_SEQ_HEADER: position}
+
+        return conditional_response(request, list_cache.get_or_build(DASHBOARD_TABLES, None, build))
+    except Exception as e:
+        logger.error("Error building dashboard: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to build dashboard"
+        )
+
+# On app rather than db_router, in both DB modes: the import takes no request
+# session, it commits batch by batch on its own sync sessions in a worker thread
+async def bulk_import(kind: str, request: Request, fmt: str | None) -> BulkImportResult:
+    fmt = fmt or format_from_content_type(request.headers.get("content-type"))
+    if fmt not in FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Upload CSV (text/csv) or NDJSON (application/x-ndjson), or pass ?format="
+        )
+
+    logger.info("Bulk importing %s from %s upload", kind, fmt)
+    spool = await spool_request_body(request)
+    try:
+        result = await run_in_threadpool(import_file, kind, spool, fmt)
+        if result.inserted:
+            # Too many rows for deltas; clients refetch
+            change_feed.publish("bulk_imported", {"kind": kind, "inserted": result.inserted})
+        return result
+    except Exception as e:
+        logger.error("Error during bulk import of %s: %s", kind, e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to import {kind}: {str(e)}"
+        )
+    finally:
+        spool.close()
+
+@app.post("/students/bulk", response_model=BulkImportResult)
+async def bulk_import_students(request: Request, fmt: str | None = Query(None, alias="format")):
+    return await bulk_import("students", request, fmt)
+
+@app.post("/courses/bulk", response_model=BulkImportResult)
+async def bulk_import_courses(request: Request, fmt: str | None = Query(None, alias="format")):
+    return await bulk_import("courses", request, fmt)
+
+@app.post("/enrollments/bulk", response_model=BulkImportResult)
+async def bulk_import_enrollments(request: Request, fmt: str | None = Query(None, alias="format")):
+    return await bulk_import("enrollments", request, fmt)
+
+@app.get("/export/{kind}")
+def export(
+    kind: str,
+    fmt: str = Query("csv", alias="format", description="csv or parquet"),
+    gzip: bool = Query(False, description="gzip the CSV, or use gzip as the Parquet codec"),
+    course_id: int | None = None,
+    student_id: int | None = None,
+):
+    # roster, transcripts or enrollments in one streamed pass, rather than a roster call per course
+    return export_response(kind, fmt, gzip, course_id, student_id)
+
+@db_router.get("/students/{student_id}/courses/", response_model=list[CourseOut])
 def student_courses(student_id: int, db: Session = Depends(get_db)):
     try:
-        logger.info(f"Fetching courses for student {student_id}")
+        logger.info("Fetching courses for student %s", student_id)
+
+        course_ids = student_course_ids(student_id)
+        if course_ids:
+            # From the in-process enrollment graph: one primary-key IN lookup, no join
+            rows = db.execute(batch_statement(Course, CourseOut, course_ids)).all()
+            return Response(serialize_rows(in_request_order(rows, course_ids)), media_type=JSON_MEDIA_TYPE)
 
         student = db.query(Student).filter(Student.id == student_id).first()
         if not student:
-            logger.warning(f"Student with ID {student_id} not found")
+            logger.warning("Student with ID %s not found", student_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Student not found"
             )
 
         courses = db.query(Course).join(Enrollment).filter(Enrollment.student_id == student_id).all()
-        logger.info(f"Found {len(courses)} courses for student {student_id}")
+        logger.info("Found %s courses for student %s", len(courses), student_id)
         return courses
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching student courses: {str(e)}")
+        logger.error("Error fetching student courses: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to fetch student courses"
         )
 
-@app.get("/courses/{course_id}/students/", response_model=list[StudentOut])
+@db_router.delete("/students/{student_id}/courses/{course_id}")
+def unenroll(student_id: int, course_id: int, db: Session = Depends(get_db)):
+    try:
+        logger.info("Unenrolling student %s from course %s", student_id, course_id)
+
+        promoted = run_write(db, unenroll_student, student_id, course_id)
+        table_versions.bump("enrollments", "courses")
+        change_feed.publish("unenrolled", {
+            "student_id": student_id, "course_id": course_id, "promoted_student_id": promoted
+        })
+
+        return {
+            "message": "Unenrolled successfully",
+            "student_id": student_id,
+            "course_id": course_id,
+            "promoted_student_id": promoted
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error during unenrollment: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to unenroll student: {str(e)}"
+        )
+
+@db_router.get("/courses/{course_id}/recommendations/", response_model=list[CourseRecommendation])
+def course_recommendations(
+    course_id: int,
+    limit: int = Query(RECOMMENDATION_COUNT, ge=1, le=TOP_K),
+    db: Session = Depends(get_db),
+):
+    # "Students who took this also took", from precomputed co-enrollment counts
+    try:
+        return recommended_courses(db, course_id, limit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching course recommendations: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch course recommendations"
+        )
+
+@db_router.get("/courses/{course_id}/waitlist/", response_model=list[StudentOut])
+def course_waitlist(course_id: int, db: Session = Depends(get_db)):
+    try:
+        return waitlisted_students(db, course_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching course waitlist: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch course waitlist"
+        )
+
+@db_router.get("/courses/{course_id}/students/", response_model=list[StudentOut])
 def course_students(course_id: int, db: Session = Depends(get_db)):
     try:
-        logger.info(f"Fetching students for course {course_id}")
+        logger.info("Fetching students for course %s", course_id)
+
+        student_ids = course_student_ids(course_id)
+        if student_ids:
+            # From the in-process enrollment graph: one primary-key IN lookup, no join
+            rows = db.execute(batch_statement(Student, StudentOut, student_ids)).all()
+            return Response(serialize_rows(in_request_order(rows, student_ids)), media_type=JSON_MEDIA_TYPE)
 
         course = db.query(Course).filter(Course.id == course_id).first()
         if not course:
-            logger.warning(f"Course with ID {course_id} not found")
+            logger.warning("Course with ID %s not found", course_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Course not found"
             )
 
         students = db.query(Student).join(Enrollment).filter(Enrollment.course_id == course_id).all()
-        logger.info(f"Found {len(students)} students for course {course_id}")
+        logger.info("Found %s students for course %s", len(students), course_id)
         return students
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching course students: {str(e)}")
+        logger.error("Error fetching course students: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to fetch course students"
         )
 
 @app.post("/genai/study-tips")
-def study_tips(request: TipsRequest):
-    api_key = os.getenv("GROQ_API_KEY")
-    print(f"API Key present: {bool(api_key)}")
-
-    if not api_key:
-        print("GROQ_API_KEY not found in environment variables")
-        # Return mock data
-        mock_tips = [
-            f"Study {request.course_title} for {request.credit_units} hours weekly",
-            "Create flashcards for key concepts",
-            "Practice with past exam papers",
-            "Join online forums related to the subject",
-            "Set specific weekly learning goals"
-        ]
-        return {"tips": mock_tips}
+async def study_tips(request: TipsRequest):
+    if not genai.get_api_key():
+        logger.info("GROQ_API_KEY not found in environment variables, returning mock tips")
+        return {"tips": genai.mock_tips(request)}
 
     try:
-        client = Groq(api_key=api_key)
-        prompt = f"Generate 3-5 practical study tips for a {request.credit_units}-credit course called '{request.course_title}'. Focus on time management, study techniques, and resource utilization. Keep tips concise and actionable."
-
-        print(f"Sending request to Groq API for course: {request.course_title}")
-
-        # Updated model list with currently working models
-        available_models = [
-            "llama-3.1-8b-instant",  # This works perfectly
-            "llama-3.1-70b-versatile",
-            "mixtral-8x7b-32768",
-            "gemma-7b-it"
-        ]
-
-        # Use the first model
-        model_to_use = available_models[0]
-        print(f"Using model: {model_to_use}")
-
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            model=model_to_use,
-            temperature=0.7,
-            max_tokens=300,
-            top_p=1,
-            stream=False,
-        )
-
-        response_content = chat_completion.choices[0].message.content
-        print(f"Groq API Response: {response_content}")
-
-        # Better tip parsing
-        tips = []
-        lines = response_content.strip().split('\n')
-        for line in lines:
-            line = line.strip()
-            if line and len(line) > 10:  # Only include substantial lines
-                # Remove numbering and bullet points
-                clean_tip = line.lstrip('123456789.-*• ').strip()
-                if clean_tip:
-                    tips.append(clean_tip)
-
-        # Ensure we have at least 3 tips
-        if len(tips) < 3:
-            tips.extend([
-                f"Review {request.course_title} materials weekly",
-                "Practice with real-world examples",
-                "Form study groups for better understanding"
-            ])
-
-        return {"tips": tips[:5]}  # Return max 5 tips
-
+        # Identical requests share one cached answer and one in-flight Groq call
+        return {"tips": await tips_cache.get_or_compute(request, lambda: genai.generate_tips(request))}
     except Exception as e:
-        print(f"Detailed Groq API error: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-
-        # Check if it's a specific Groq error
-        if hasattr(e, 'status_code'):
-            print(f"Status code: {e.status_code}")
-        if hasattr(e, 'body'):
-            print(f"Error body: {e.body}")
-
-        fallback_tips = [
-            f"Allocate {credit_hours} hours per week for {request.course_title}",
-            "Create a study schedule and stick to it consistently",
-            "Break complex topics into smaller, manageable sections",
-            "Use active recall by testing yourself without notes",
-            "Create visual aids like mind maps and diagrams",
-            "Form study groups to discuss difficult concepts",
-            "Practice with past exams and timed exercises",
-            "Teach the material to someone else to reinforce learning",
-            "Use multiple resources - textbooks, videos, and online tutorials",
-            "Review notes within 24 hours of each study session"
-        ]
-
-        # Return 5 high-quality, relevant tips
-        import random
-        selected_tips = random.sample(fallback_tips, min(5, len(fallback_tips)))
-        print(f"Using fallback tips for {request.course_title}")
-        return {"tips": selected_tips}
+        logger.warning("Groq API unavailable (%s: %s), using fallback tips for %s", type(e).__name__, e, request.course_title)
+        return {"tips": genai.fallback_tips(request)}
+
+@app.get("/genai/study-tips/stream")
+async def study_tips_stream(request: TipsRequest = Depends()):
+    # Server-Sent Events: one "tip" event per tip as soon as it is complete, then "done"
+    async def events():
+        if not genai.get_api_key():
+            tips, source = genai.mock_tips(request), "mock"
+        else:
+            tips, source = await tips_cache.get(request), "cache"
+        if tips is not None:
+            for tip in tips:
+                yield genai.sse_event("tip", {"tip": tip})
+            yield genai.sse_event("done", {"tips": tips, "source": source})
+            return
+
+        streamed = []
+        try:
+            async for tip in genai.stream_tips(request):
+                if len(streamed) < 5:
+                    streamed.append(tip)
+                    yield genai.sse_event("tip", {"tip": tip})
+            tips = genai.pad_tips(request, streamed)
+            source = "groq"
+            await tips_cache.put(request, tips)
+        except Exception as e:
+            logger.warning("Groq streaming unavailable (%s: %s), using fallback tips for %s", type(e).__name__, e, request.course_title)
+            # Keep whatever already reached the client and top up from the local list
+            tips = streamed + [tip for tip in genai.fallback_tips(request) if tip not in streamed]
+            tips = tips[:max(5, len(streamed))]
+            source = "fallback"
+
+        for tip in tips[len(streamed):]:
+            yield genai.sse_event("tip", {"tip": tip})
+        yield genai.sse_event("done", {"tips": tips, "source": source})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/genai/study-tips/cache")
+def study_tips_cache_stats():
+    return {**tips_cache.stats(), "circuit_breaker": genai.breaker.state}
+
+if settings.db_async:
+    # Only imported when used: defining its routes is a measurable share of import time
+    from .async_routes import router as async_router
+    app.include_router(async_router)
+else:
+    app.include_router(db_router)
 
 @app.get("/debug/endpoints")
 def list_endpoints():
@@ -427,4 +721,5 @@ def list_endpoints():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
+    # log_config=None lets uvicorn's loggers propagate into the queued JSON pipeline
+    uvicorn.run(app, host="127.0.0.1", port=8000, log_config=None)
\ No newline at end of file
@@ -0,0 +1,276 @@
+import abc
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# Statements kept per request for the slow-request log
+MAX_RECORDED_STATEMENTS = 20
+MAX_STATEMENT_LENGTH = 300
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = labels
+        self._lock = threading.Lock()
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    @abc.abstractmethod
+    def _samples(self) -> list[str]:
+        ...
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        # Per label set: [count per bucket (non-cumulative, last is +Inf), sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.add(Counter(
+    "http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status")))
+REQUEST_DURATION = registry.add(Histogram(
+    "http_request_duration_seconds", "Time to the end of the response body, by route.", ("method", "route")))
+IN_FLIGHT = registry.add(Gauge(
+    "http_requests_in_flight", "Requests currently being handled.", ("method",)))
+REQUEST_QUERIES = registry.add(Histogram(
+    "http_request_db_queries", "SQL statements executed per request.", ("method", "route"), QUERY_COUNT_BUCKETS))
+REQUEST_DB_DURATION = registry.add(Histogram(
+    "http_request_db_duration_seconds", "Time spent in SQL per request.", ("method", "route")))
+DB_QUERIES = registry.add(Counter(
+    "db_queries_total", "SQL statements executed, in or outside requests.", ()))
+DB_DURATION = registry.add(Counter(
+    "db_query_duration_seconds_total", "Total time spent executing SQL.", ()))
+DB_QUERY_ERRORS = registry.add(Counter(
+    "db_query_errors_total", "SQL statements that raised, e.g. on a constraint or a lock timeout.", ()))
+WRITE_BATCH_SIZE = registry.add(Histogram(
+    "write_queue_batch_size", "Operations committed together by the write queue.", (), BATCH_SIZE_BUCKETS))
+WRITE_BATCH_DURATION = registry.add(Histogram(
+    "write_queue_batch_duration_seconds", "Time to run and commit one write queue batch.", ()))
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    sql_seconds: float = 0.0
+    statements: list[tuple[str, float]] = field(default_factory=list)
+
+
+# Set for the duration of each request; threadpool handlers inherit it
+current_request: contextvars.ContextVar[RequestStats | None] = contextvars.ContextVar("current_request", default=None)
+
+
+# The start time lives on the statement's execution context, which is dropped
+# with it, so a statement that raises leaves nothing behind on the connection
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _record_query(context, statement)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # Failed statements are counted and timed too; lock timeouts are the slowest of all
+    if _record_query(exception_context.execution_context, exception_context.statement):
+        DB_QUERY_ERRORS.inc()
+
+
+def _record_query(context, statement: str | None) -> bool:
+    """Count and time a statement once; False if it never reached the cursor or was already recorded."""
+    started = getattr(context, "_query_started", None)
+    if started is None:
+        return False
+    del context._query_started
+    elapsed = time.perf_counter() - started
+    DB_QUERIES.inc()
+    DB_DURATION.inc(amount=elapsed)
+
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_seconds += elapsed
+        if len(stats.statements) < MAX_RECORDED_STATEMENTS:
+            stats.statements.append((statement, elapsed))
+    return True
+
+
+def route_label(scope) -> str:
+    # The route template, not the raw path, so /students/1 and /students/2 share a series
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed bodies are timed to their last chunk."""
+
+    def __init__(self, app, response_headers: bool = False, slow_request_seconds: float | None = None):
+        self.app = app
+        self.response_headers = response_headers
+        self.slow_request_seconds = slow_request_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.response_headers:
+                    app_ms = (time.perf_counter() - started) * 1000
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", (
+                        f"app;dur={app_ms:.1f}, db;dur={stats.sql_seconds * 1000:.1f};desc=\"{stats.queries} queries\""
+                    ).encode()))
+                    headers.append((b"x-db-queries", str(stats.queries).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        IN_FLIGHT.inc(method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec(method)
+            current_request.reset(token)
+            route = route_label(scope)
+            REQUESTS.inc(method, route, str(status_code))
+            REQUEST_DURATION.observe(elapsed, method, route)
+            REQUEST_QUERIES.observe(stats.queries, method, route)
+            REQUEST_DB_DURATION.observe(stats.sql_seconds, method, route)
+            if self.slow_request_seconds is not None and elapsed >= self.slow_request_seconds:
+                self._log_slow_request(method, scope.get("path", ""), route, status_code, elapsed, stats)
+
+    @staticmethod
+    def _log_slow_request(method, path, route, status_code, elapsed, stats: RequestStats):
+        statements = [
+            {"ms": round(seconds * 1000, 1), "sql": " ".join(statement.split())[:MAX_STATEMENT_LENGTH]}
+            for statement, seconds in stats.statements
+        ]
+        listing = "".join(f"\n  {s['ms']:.1f} ms  {s['sql']}" for s in statements)
+        if stats.queries > len(statements):
+            listing += f"\n  ... {stats.queries - len(statements)} more"
+        logger.warning(
+            "Slow request %s %s (%s) -> %s in %.0f ms, %s queries / %.0f ms in SQL%s",
+            method, path, route, status_code, elapsed * 1000, stats.queries, stats.sql_seconds * 1000, listing,
+            extra={"route": route, "duration_ms": round(elapsed * 1000, 1), "queries": stats.queries,
+                   "statements": statements},
+        )
@@ -0,0 +1,80 @@
+import argparse
+import dataclasses
+import logging
+import time
+
+from sqlalchemy import func, inspect, select, text, update
+
+from .config import get_settings
+from .database import Base, create_db_engine
+from .models import Course, Enrollment
+from .search import install_search_index
+
+logger = logging.getLogger(__name__)
+
+# Columns added to existing tables since the first release; create_all only
+# creates missing tables, so older databases get these through upgrade()
+ADDED_COLUMNS = [
+    ("courses", "capacity", "INTEGER"),
+    ("courses", "enrolled_count", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+
+def upgrade(engine):
+    """Add any missing columns and indexes to an existing database and backfill them."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        tables = set(inspector.get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+            # Likewise create_all skips indexes declared after their table was created
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    logger.info("Creating index %s", index.name)
+                    index.create(conn)
+        for table, column, ddl in ADDED_COLUMNS:
+            if column in {c["name"] for c in inspector.get_columns(table)}:
+                continue
+            logger.info("Adding column %s.%s", table, column)
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+            if (table, column) == ("courses", "enrolled_count"):
+                # One pass over the existing enrollments; enroll keeps it current from here on
+                conn.execute(update(Course).values(enrolled_count=(
+                    select(func.count()).where(Enrollment.course_id == Course.id).scalar_subquery()
+                )))
+        install_search_index(conn)
+
+
+def migrate(engine) -> float:
+    """Create missing tables, then upgrade existing ones; safe to run repeatedly.
+
+    Returns the seconds taken.
+    """
+    started = time.perf_counter()
+    Base.metadata.create_all(bind=engine)
+    upgrade(engine)
+    elapsed = time.perf_counter() - started
+    logger.info("Database schema up to date in %.0f ms", elapsed * 1000)
+    return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create or upgrade the database schema, e.g. as a deploy step.")
+    parser.add_argument("--database-url", help="Defaults to DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    settings = get_settings()
+    if args.database_url:
+        settings = dataclasses.replace(settings, database_url=args.database_url)
+    engine = create_db_engine(settings)
+    try:
+        migrate(engine)
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
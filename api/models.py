@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Float, Text, ForeignKey, Index, UniqueConstraint
 from .database import Base
 from sqlalchemy.orm import relationship
 
@@ -10,6 +10,8 @@ class Student(Base):
     
     # Relationships should be inside the class
     enrollments = relationship("Enrollment", back_populates="student")
+    # Read-only shortcut through enrollments, for eager loading with ?expand=courses
+    courses = relationship("Course", secondary="enrollments", viewonly=True, order_by="Course.id")
 
 class Course(Base):
     __tablename__ = "courses"
@@ -18,9 +20,13 @@ class Course(Base):
     code = Column(String, unique=True, nullable=False)
     credit_units = Column(Integer, nullable=False)
     description = Column(String)
+    capacity = Column(Integer)  # NULL means unlimited
+    # Kept in step with the enrollments table by enroll/unenroll, so seat checks don't COUNT(*)
+    enrolled_count = Column(Integer, nullable=False, default=0, server_default="0")
     
     # Relationships should be inside the class
     enrollments = relationship("Enrollment", back_populates="course")
+    students = relationship("Student", secondary="enrollments", viewonly=True, order_by="Student.id")
 
 class Enrollment(Base):
     __tablename__ = "enrollments"
@@ -28,8 +34,26 @@ class Enrollment(Base):
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
     course_id = Column(Integer, ForeignKey("courses.id"), nullable=False)
     
-    __table_args__ = (UniqueConstraint('student_id', 'course_id', name='unique_enrollment'),)
+    __table_args__ = (
+        UniqueConstraint('student_id', 'course_id', name='unique_enrollment'),
+        # unique_enrollment's index leads with student_id, so course rosters need their own
+        Index('ix_enrollments_course_id', 'course_id'),
+    )
     
     # Relationships should be inside the class
     student = relationship("Student", back_populates="enrollments")
-    course = relationship("Course", back_populates="enrollments")
\ No newline at end of file
+    course = relationship("Course", back_populates="enrollments")
+
+class WaitlistEntry(Base):
+    __tablename__ = "waitlist"
+    id = Column(Integer, primary_key=True, index=True)  # also the queue order
+    student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
+    course_id = Column(Integer, ForeignKey("courses.id"), nullable=False)
+
+    __table_args__ = (UniqueConstraint('student_id', 'course_id', name='unique_waitlist'),)
+
+class StudyTipsCacheEntry(Base):
+    __tablename__ = "study_tips_cache"
+    key = Column(String, primary_key=True)
+    tips = Column(Text, nullable=False)  # JSON-encoded list of tips
+    created_at = Column(Float, nullable=False)  # Unix timestamp, for TTL checks
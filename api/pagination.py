@@ -0,0 +1,102 @@
+from typing import AsyncIterator, Iterator
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import select
+
+from .database import SessionLocal, get_async_sessionmaker
+from .serialization import schema_columns, serialize_ndjson
+
+# Largest page a client may ask for with ?limit=
+MAX_PAGE_SIZE = 1000
+# Rows fetched per round trip when streaming NDJSON
+STREAM_CHUNK_SIZE = 1000
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def keyset_statement(model, after: int | None = None, limit: int | None = None,
+                     schema: type[BaseModel] | None = None):
+    """Select rows ordered by id, starting strictly after the given cursor.
+
+    Seeking on the primary key keeps every page an index range scan, no matter
+    how deep into the table the client is, unlike OFFSET which rescans skipped rows.
+    With a schema, only its columns are selected, as plain tuples.
+    """
+    stmt = select(*schema_columns(model, schema)) if schema is not None else select(model)
+    if after is not None:
+        stmt = stmt.where(model.id > after)
+    stmt = stmt.order_by(model.id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def next_cursor_headers(rows, limit: int | None) -> dict:
+    # A full page means there may be more rows; hand back the cursor for the next one
+    if limit is not None and rows and len(rows) == limit:
+        return {NEXT_CURSOR_HEADER: str(rows[-1].id)}
+    return {}
+
+
+def iter_keyset_chunks(model, schema: type[BaseModel], after: int | None = None, limit: int | None = None,
+                       chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[list]:
+    """Walk a table in id order, yielding one chunk of schema-shaped row tuples at a time.
+
+    Uses its own session because the request-scoped one from get_db is closed
+    before a StreamingResponse starts sending its body.
+    """
+    db = SessionLocal()
+    try:
+        cursor = after
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            rows = db.execute(keyset_statement(model, cursor, size, schema)).all()
+            if not rows:
+                break
+            yield rows
+            cursor = rows[-1].id
+            if remaining is not None:
+                remaining -= len(rows)
+            if len(rows) < size:
+                break
+    finally:
+        db.close()
+
+
+def ndjson_response(model, schema: type[BaseModel], after: int | None = None,
+                    limit: int | None = None) -> StreamingResponse:
+    def generate():
+        for rows in iter_keyset_chunks(model, schema, after=after, limit=limit):
+            yield serialize_ndjson(rows)
+
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
+
+
+async def aiter_keyset_chunks(model, schema: type[BaseModel], after: int | None = None, limit: int | None = None,
+                              chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[list]:
+    async with get_async_sessionmaker()() as db:
+        cursor = after
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            rows = (await db.execute(keyset_statement(model, cursor, size, schema))).all()
+            if not rows:
+                break
+            yield rows
+            cursor = rows[-1].id
+            if remaining is not None:
+                remaining -= len(rows)
+            if len(rows) < size:
+                break
+
+
+def async_ndjson_response(model, schema: type[BaseModel], after: int | None = None,
+                          limit: int | None = None) -> StreamingResponse:
+    async def generate():
+        async for rows in aiter_keyset_chunks(model, schema, after=after, limit=limit):
+            yield serialize_ndjson(rows)
+
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,134 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from fastapi import Request, Response
+
+from .config import Settings, get_settings
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+class TableVersions:
+    """Per-table counters, bumped after every committed write to that table."""
+
+    def __init__(self):
+        self._versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, *tables: str) -> int:
+        # Counters only go up, so the sum changes whenever any of the tables does
+        return sum(self._versions.get(table, 0) for table in tables)
+
+    def bump(self, *tables: str):
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+
+@dataclass
+class CachedBody:
+    version: int
+    expires_at: float
+    body: bytes
+    etag: str
+    headers: dict = field(default_factory=dict)
+
+
+def make_etag(body: bytes) -> str:
+    # Content hash rather than the version number, so ETags agree across workers
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class ListCache:
+    """Serialized list responses, reused until their table's version changes.
+
+    Versions are per process, so with several workers a write handled by one
+    worker is only seen by the others once their entry's TTL runs out.
+    """
+
+    def __init__(self, versions: TableVersions, ttl: float = 30, max_entries: int = 256):
+        self.versions = versions
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, CachedBody] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, versions: TableVersions, settings: Settings) -> "ListCache":
+        return cls(versions, ttl=settings.list_cache_ttl, max_entries=settings.list_cache_size)
+
+    # `table` may also be a tuple of table names, for responses that read several
+
+    def lookup(self, table: str | tuple[str, ...], key) -> CachedBody | None:
+        with self._lock:
+            entry = self._entries.get((table, key))
+            if entry is None:
+                return None
+            if entry.version != self._version(table) or entry.expires_at <= time.monotonic():
+                del self._entries[(table, key)]
+                return None
+            self._entries.move_to_end((table, key))
+            return entry
+
+    def store(self, table: str | tuple[str, ...], key, version: int, body: bytes, headers: dict | None = None) -> CachedBody:
+        entry = CachedBody(version, time.monotonic() + self.ttl, body, make_etag(body), headers or {})
+        with self._lock:
+            self._entries[(table, key)] = entry
+            self._entries.move_to_end((table, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def get_or_build(self, table: str | tuple[str, ...], key, build: Callable[[], tuple[bytes, dict]]) -> CachedBody:
+        entry = self.lookup(table, key)
+        if entry is None:
+            # Read the version before querying: a write that lands mid-build
+            # leaves the entry already stale instead of caching old rows as new
+            version = self._version(table)
+            body, headers = build()
+            entry = self.store(table, key, version, body, headers)
+        return entry
+
+    async def aget_or_build(self, table: str | tuple[str, ...], key, build: Callable[[], Awaitable[tuple[bytes, dict]]]) -> CachedBody:
+        entry = self.lookup(table, key)
+        if entry is None:
+            version = self._version(table)
+            body, headers = await build()
+            entry = self.store(table, key, version, body, headers)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _version(self, table: str | tuple[str, ...]) -> int:
+        return self.versions.get(*table) if isinstance(table, tuple) else self.versions.get(table)
+
+
+def conditional_response(request: Request, entry: CachedBody) -> Response:
+    headers = {
+        **entry.headers,
+        "ETag": entry.etag,
+        # Let browsers keep the body but revalidate every time
+        "Cache-Control": "no-cache",
+    }
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type=JSON_MEDIA_TYPE, headers=headers)
+
+
+table_versions = TableVersions()
+list_cache = ListCache.from_settings(table_versions, get_settings())
@@ -0,0 +1,280 @@
+import logging
+import queue
+import threading
+import time
+from itertools import chain
+from typing import Callable
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .change_feed import ChangeEvent
+from .config import Settings, get_settings
+from .database import SessionLocal
+from .models import Course, Enrollment
+from .schemas import CourseOut
+from .serialization import schema_columns
+
+logger = logging.getLogger(__name__)
+
+# Recommendations kept per course, and so the most ?limit= can ask for
+TOP_K = 20
+RECOMMENDATION_COUNT = 5
+# Enrollment rows converted to arrays at a time while loading
+LOAD_CHUNK_SIZE = 100_000
+
+_RELOAD = object()
+_STOP = object()
+
+
+def top_k(counts, rows, k: int) -> dict[int, list[tuple[int, int]]]:
+    """Each row's k largest off-diagonal entries as (column, count), largest first.
+
+    One lexsort over the rows' nonzeros, ranking entries within their row by
+    count (ties to the lower column), instead of sorting row by row.
+    """
+    import numpy as np
+
+    rows = np.asarray(rows, dtype=np.int64)
+    sub = counts[rows].tocoo()
+    keep = (sub.data > 0) & (sub.col != rows[sub.row])  # a course isn't its own recommendation
+    row, col, data = sub.row[keep], sub.col[keep], sub.data[keep]
+    order = np.lexsort((col, -data, row))
+    row, col, data = row[order], col[order], data[order]
+    rank = np.arange(len(row)) - np.searchsorted(row, row)
+    top = rank < k
+    row, col, data = row[top], col[top], data[top]
+    bounds = np.searchsorted(row, np.arange(len(rows) + 1))
+    cols, values = col.tolist(), data.tolist()
+    return {
+        int(course): list(zip(cols[lo:hi], values[lo:hi]))
+        for course, lo, hi in zip(rows.tolist(), bounds[:-1].tolist(), bounds[1:].tolist())
+    }
+
+
+class CoEnrollment:
+    """"Students who took X also took Y", from a course x course co-enrollment matrix.
+
+    With A the sparse student x course enrollment matrix, C = A^T A counts
+    for every pair of courses the students they share (the diagonal is each
+    course's size). C and each course's top TOP_K rows are computed with
+    scipy.sparse in one pass at load. New enrollments then arrive through
+    the change feed and are applied in batches by a background thread: for
+    the students they touch, with D their change in A, C grows by
+    A^T D + D^T A + D^T D, and only the courses whose row changed get their
+    top list recomputed. Reads are a dict lookup. The feed only carries this
+    process's writes, so the matrix is also rebuilt once `refresh` seconds
+    pass since the last build, which bounds how stale it can get from writes
+    made by other processes.
+
+    numpy and scipy are only imported by that thread, so the app runs
+    without them; recommendations then answer 503.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal,
+                 top: int = TOP_K, window: float = 0.5, refresh: float = 300.0):
+        self.session_factory = session_factory
+        self.top = top
+        self.window = window
+        self.refresh = refresh
+        self._loaded_at = 0.0
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._enrolled = None  # A, students x courses
+        self._counts = None  # C, courses x courses
+        self._top: dict[int, list[tuple[int, int]]] | None = None
+        self.error: str | None = None
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "CoEnrollment | None":
+        if not settings.recommendations:
+            return None
+        return cls(refresh=settings.recommendations_refresh)
+
+    @property
+    def ready(self) -> bool:
+        return self._top is not None
+
+    def start(self):
+        """Load in the background, then keep applying changes from apply()."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="co-enrollment", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def apply(self, event: ChangeEvent):
+        """Change feed listener; only queues the change, the background thread does the math."""
+        if event.kind == "enrolled":
+            self._queue.put((True, event.data["student_id"], event.data["course_id"]))
+        elif event.kind == "unenrolled":
+            self._queue.put((False, event.data["student_id"], event.data["course_id"]))
+            if event.data.get("promoted_student_id") is not None:
+                self._queue.put((True, event.data["promoted_student_id"], event.data["course_id"]))
+        elif event.kind == "bulk_imported" and event.data.get("kind") == "enrollments":
+            self._queue.put(_RELOAD)
+
+    def recommend(self, course_id: int, limit: int) -> list[tuple[int, int]] | None:
+        """Up to limit (course_id, shared students) pairs, most shared first; None until loaded."""
+        if self._top is None:
+            return None
+        return self._top.get(course_id, [])[:limit]
+
+    def _loop(self):
+        try:
+            self.load()
+        except ImportError as e:
+            self.error = f"Recommendations need numpy and scipy ({e})"
+            logger.warning("%s; /courses/{id}/recommendations will answer 503", self.error)
+            return
+        except Exception as e:
+            self.error = "Recommendations failed to load"
+            logger.error("Error building co-enrollment matrix: %s", e)
+            return
+        while True:
+            changes, reload, stop = self._collect()
+            try:
+                if reload:
+                    self.load()
+                elif changes:
+                    self.update(changes)
+            except Exception as e:
+                logger.error("Error updating co-enrollment matrix: %s", e)
+            if stop:
+                return
+
+    def _collect(self) -> tuple[list, bool, bool]:
+        # Block for the first change, then take whatever else arrives within the window.
+        # A due refresh is a full rebuild; changes still queued then are applied after it
+        changes, reload = [], False
+        timeout = None
+        if self.refresh:
+            timeout = self._loaded_at + self.refresh - time.monotonic()
+            if timeout <= 0:
+                return changes, True, False
+        try:
+            item = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return changes, True, False
+        deadline = time.monotonic() + self.window
+        while True:
+            if item is _STOP:
+                return changes, reload, True
+            if item is _RELOAD:
+                reload = True
+            else:
+                changes.append(item)
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return changes, reload, False
+
+    def load(self):
+        import numpy as np
+        from scipy import sparse
+
+        started = time.perf_counter()
+        chunks = []
+        with self.session_factory() as db:
+            # Core rather than ORM rows, flattened straight into arrays: np.array()
+            # on Row objects probes each one for array attributes and is ~10x slower
+            result = db.connection().execution_options(yield_per=LOAD_CHUNK_SIZE).execute(
+                select(Enrollment.student_id, Enrollment.course_id)
+            )
+            for partition in result.partitions():
+                chunks.append(np.fromiter(chain.from_iterable(partition), dtype=np.int64, count=2 * len(partition)))
+        pairs = np.concatenate(chunks).reshape(-1, 2) if chunks else np.empty((0, 2), dtype=np.int64)
+        students, courses = pairs[:, 0], pairs[:, 1]
+        shape = (int(students.max(initial=0)) + 1, int(courses.max(initial=0)) + 1)
+
+        enrolled = sparse.csr_matrix((np.ones(len(pairs), dtype=np.int32), (students, courses)), shape=shape)
+        counts = (enrolled.T @ enrolled).tocsr()
+        self._enrolled, self._counts = enrolled, counts
+        self._top = top_k(counts, np.arange(shape[1]), self.top)
+        self._loaded_at = time.monotonic()
+        logger.info("Built co-enrollment matrix: %s enrollments, %s course pairs in %.0f ms",
+                    len(pairs), counts.nnz, (time.perf_counter() - started) * 1000)
+
+    def update(self, changes: list[tuple[bool, int, int]]):
+        """Apply (enrolled, student_id, course_id) changes, in order, to C and the affected top lists."""
+        import numpy as np
+        from scipy import sparse
+
+        enrolled, counts = self._enrolled, self._counts
+        students = sorted({student_id for _, student_id, _ in changes})
+        course_count = max(counts.shape[0], max(course_id for _, _, course_id in changes) + 1)
+        if students[-1] >= enrolled.shape[0] or course_count > enrolled.shape[1]:
+            enrolled = enrolled.copy()
+            enrolled.resize((max(enrolled.shape[0], students[-1] + 1), course_count))
+            counts = counts.copy()
+            counts.resize((course_count, course_count))
+
+        # The touched students' rows before and after, as sets, so a change
+        # already counted (e.g. committed while load() was reading) is a no-op
+        before = enrolled[students]
+        rows = {student_id: set(before.indices[before.indptr[i]:before.indptr[i + 1]].tolist())
+                for i, student_id in enumerate(students)}
+        after = {student_id: set(courses) for student_id, courses in rows.items()}
+        for is_enrolled, student_id, course_id in changes:
+            (after[student_id].add if is_enrolled else after[student_id].discard)(course_id)
+
+        entries = [
+            (i, course_id, 1 if course_id in after[student_id] else -1)
+            for i, student_id in enumerate(students)
+            for course_id in after[student_id] ^ rows[student_id]
+        ]
+        if not entries:
+            return
+        index, cols, values = (np.array(column) for column in zip(*entries))
+        delta = sparse.csr_matrix((values.astype(np.int32), (index, cols)), shape=(len(students), course_count))
+
+        # (A + D)^T (A + D) - A^T A, over the touched rows only
+        counts_delta = (before.T @ delta + delta.T @ before + delta.T @ delta).tocoo()
+        counts = (counts + counts_delta).tocsr()
+        counts.eliminate_zeros()
+        enrolled = enrolled + sparse.csr_matrix(
+            (values.astype(np.int32), (np.asarray(students)[index], cols)), shape=enrolled.shape
+        )
+        changed = np.unique(counts_delta.row[counts_delta.data != 0])
+
+        self._enrolled, self._counts = enrolled, counts
+        self._top = {**self._top, **top_k(counts, changed, self.top)}
+
+
+co_enrollment = CoEnrollment.from_settings(get_settings())
+
+
+def recommended_courses(db: Session, course_id: int, limit: int) -> list[dict]:
+    """Courses most often taken together with course_id, each with its shared student count.
+
+    Raises 503 while recommendations are off or loading, and 404 for an unknown course.
+    """
+    if co_enrollment is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Course recommendations are turned off; set RECOMMENDATIONS=true"
+        )
+    recommended = co_enrollment.recommend(course_id, limit)
+    if recommended is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=co_enrollment.error or "Course recommendations are still loading",
+            headers=None if co_enrollment.error else {"Retry-After": "5"}
+        )
+    if not recommended:
+        if db.get(Course, course_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Course not found"
+            )
+        return []
+
+    shared = dict(recommended)
+    rows = db.execute(select(*schema_columns(Course, CourseOut)).where(Course.id.in_(shared))).all()
+    by_id = {row.id: row for row in rows}
+    return [{**by_id[i]._mapping, "co_enrolled": n} for i, n in recommended if i in by_id]
@@ -1,4 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
+
+# Largest number of pairs a single /enroll/batch call may carry
+MAX_BATCH_ENROLLMENTS = 500
 
 class StudentCreate(BaseModel):
     name: str
@@ -17,6 +20,7 @@ class CourseCreate(BaseModel):
     code: str
     credit_units: int
     description: str | None = None
+    capacity: int | None = Field(None, ge=1)  # omit for unlimited seats
 
 class CourseOut(BaseModel):
     id: int
@@ -24,6 +28,8 @@ class CourseOut(BaseModel):
     code: str
     credit_units: int
     description: str | None
+    capacity: int | None = None
+    enrolled_count: int = 0
 
     class Config:
         from_attributes = True
@@ -32,6 +38,70 @@ class EnrollCreate(BaseModel):
     student_id: int
     course_id: int
 
+class EnrollmentOut(BaseModel):
+    id: int
+    student_id: int
+    course_id: int
+
+    class Config:
+        from_attributes = True
+
+class DashboardStudent(StudentOut):
+    enrolled_courses: int
+    total_credit_units: int
+
+class DashboardOut(BaseModel):
+    students: list[DashboardStudent]
+    courses: list[CourseOut]
+    # (student_id, course_id) pairs, so drill-downs need no further requests
+    enrollments: list[tuple[int, int]]
+    total_enrollments: int
+
+class CourseRecommendation(CourseOut):
+    co_enrolled: int  # students enrolled in both this course and the one asked about
+
+class EnrollBatch(BaseModel):
+    # Either one student into many courses, or many students into one course
+    student_id: int | None = None
+    course_ids: list[int] | None = Field(None, min_length=1, max_length=MAX_BATCH_ENROLLMENTS)
+    course_id: int | None = None
+    student_ids: list[int] | None = Field(None, min_length=1, max_length=MAX_BATCH_ENROLLMENTS)
+
+    @model_validator(mode="after")
+    def check_shape(self):
+        one_student = self.student_id is not None and self.course_ids is not None
+        one_course = self.course_id is not None and self.student_ids is not None
+        if one_student == one_course:
+            raise ValueError("Provide either student_id with course_ids, or course_id with student_ids")
+        return self
+
+    def pairs(self) -> list[tuple[int, int]]:
+        if self.course_ids is not None:
+            return [(self.student_id, course_id) for course_id in self.course_ids]
+        return [(student_id, self.course_id) for student_id in self.student_ids]
+
+class EnrollPairResult(BaseModel):
+    student_id: int
+    course_id: int
+    status: str
+    detail: str | None = None
+
+class EnrollBatchResult(BaseModel):
+    enrolled: int
+    failed: int
+    results: list[EnrollPairResult]
+
 class TipsRequest(BaseModel):
     course_title: str
-    credit_units: int
\ No newline at end of file
+    credit_units: int
+
+class BulkRowError(BaseModel):
+    row: int
+    error: str
+    detail: str | None = None
+
+class BulkImportResult(BaseModel):
+    received: int = 0
+    inserted: int = 0
+    failed: int = 0
+    errors: list[BulkRowError] = []
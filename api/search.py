@@ -0,0 +1,118 @@
+import logging
+import re
+
+from sqlalchemy import Column, Integer, MetaData, Table, func, inspect, literal_column, or_, select, text
+
+from .models import Course
+
+logger = logging.getLogger(__name__)
+
+# Results per page for /courses/search; type-ahead only ever shows the first one
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+# bm25 weights for title, code and description: a hit in the title or code
+# outranks one buried in a description
+FTS_WEIGHTS = (10.0, 10.0, 1.0)
+
+# External-content FTS5 table: it stores only the index and reads the text
+# back from courses, so the catalog isn't duplicated on disk. The prefix
+# option adds 2- and 3-character prefix indexes for type-ahead queries.
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE courses_fts USING fts5("
+    "title, code, description, content='courses', content_rowid='id', prefix='2 3')",
+    # The triggers run inside the writing statement, so create_course, the
+    # bulk importers and raw SQL all keep the index in step
+    "CREATE TRIGGER courses_fts_insert AFTER INSERT ON courses BEGIN "
+    "INSERT INTO courses_fts(rowid, title, code, description) "
+    "VALUES (new.id, new.title, new.code, new.description); END",
+    "CREATE TRIGGER courses_fts_delete AFTER DELETE ON courses BEGIN "
+    "INSERT INTO courses_fts(courses_fts, rowid, title, code, description) "
+    "VALUES ('delete', old.id, old.title, old.code, old.description); END",
+    # Seat counter updates don't touch the indexed columns, so they skip the trigger
+    "CREATE TRIGGER courses_fts_update AFTER UPDATE OF title, code, description ON courses BEGIN "
+    "INSERT INTO courses_fts(courses_fts, rowid, title, code, description) "
+    "VALUES ('delete', old.id, old.title, old.code, old.description); "
+    "INSERT INTO courses_fts(rowid, title, code, description) "
+    "VALUES (new.id, new.title, new.code, new.description); END",
+    # Index whatever rows the database already holds
+    "INSERT INTO courses_fts(courses_fts) VALUES ('rebuild')",
+]
+
+# A stored generated column is PostgreSQL's equivalent of the triggers above:
+# the server recomputes it on every write. The 'simple' configuration skips
+# stemming and stop words, so course codes and partial words match as typed.
+POSTGRES_DDL = [
+    "ALTER TABLE courses ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(code, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')) STORED",
+    "CREATE INDEX ix_courses_search_vector ON courses USING GIN (search_vector)",
+]
+
+_fts = Table("courses_fts", MetaData(), Column("rowid", Integer))
+_search_vector = literal_column("courses.search_vector")
+
+
+def install_search_index(conn):
+    """Create the course search index and its sync machinery if it's missing."""
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        if inspect(conn).has_table("courses_fts"):
+            return
+        statements = SQLITE_DDL
+    elif dialect == "postgresql":
+        if "search_vector" in {c["name"] for c in inspect(conn).get_columns("courses")}:
+            return
+        statements = POSTGRES_DDL
+    else:
+        logger.warning("No full-text index for %s; course search falls back to LIKE", dialect)
+        return
+
+    logger.info("Building the course search index")
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+def search_terms(query: str) -> list[str]:
+    # Word characters only, so user input can never inject FTS or tsquery syntax
+    return re.findall(r"\w+", query.lower())
+
+
+def fts5_query(terms: list[str]) -> str:
+    # Every term must match; the last one may still be half typed
+    return " ".join(f'"{term}"' for term in terms[:-1]) + f' "{terms[-1]}"*'
+
+
+def tsquery(terms: list[str]) -> str:
+    return " & ".join(terms[:-1] + [f"{terms[-1]}:*"])
+
+
+def search_statement(dialect: str, query: str, limit: int = SEARCH_PAGE_SIZE, offset: int = 0):
+    """Courses matching every word of query, best match first; None if query has no words."""
+    terms = search_terms(query)
+    if not terms:
+        return None
+
+    stmt = select(Course)
+    if dialect == "sqlite":
+        match = literal_column("courses_fts")
+        stmt = (
+            stmt.join(_fts, _fts.c.rowid == Course.id)
+            .where(match.op("MATCH")(fts5_query(terms)))
+            .order_by(func.bm25(match, *FTS_WEIGHTS), Course.id)
+        )
+    elif dialect == "postgresql":
+        ts_query = func.to_tsquery("simple", tsquery(terms))
+        stmt = (
+            stmt.where(_search_vector.op("@@")(ts_query))
+            .order_by(func.ts_rank(_search_vector, ts_query).desc(), Course.id)
+        )
+    else:
+        for term in terms:
+            pattern = f"%{term}%"
+            stmt = stmt.where(or_(
+                Course.title.ilike(pattern), Course.code.ilike(pattern), Course.description.ilike(pattern)
+            ))
+        stmt = stmt.order_by(Course.id)
+    return stmt.limit(limit).offset(offset)
@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# Point the app at a throwaway database before api.database creates its engine,
+# so test runs neither depend on nor modify the checked-in enrollment.db
+_test_db_dir = tempfile.mkdtemp(prefix="enrollment-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_test_db_dir, 'test.db')}"
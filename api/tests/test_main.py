@@ -1,11 +1,20 @@
+import asyncio
+import json
+import time
+import uuid
+
 from fastapi.testclient import TestClient
 from ..main import app
-from ..database import SessionLocal, Base, engine
+from ..database import SessionLocal, engine
+from ..migrations import migrate
+from ..models import Student, Course
+from ..schemas import TipsRequest
 
 client = TestClient(app)
 
 def setup_module():
-    Base.metadata.create_all(bind=engine)
+    # Importing the app no longer touches the database; the lifespan hook or this does
+    migrate(engine)
 
 def test_create_enroll_duplicate():
     # Create student
@@ -30,4 +39,857 @@ def test_student_courses():
 
 def test_study_tips():
     r = client.post("/genai/study-tips", json={"course_title": "Physics", "credit_units": 4})
-    assert r.status_code in [200, 500]  # 500 if no key, 200 if yes
\ No newline at end of file
+    assert r.status_code in [200, 500]  # 500 if no key, 200 if yes
+
+def test_students_keyset_pagination():
+    for i in range(3):
+        client.post("/students/", json={"name": f"Page {i}", "email": f"page{i}-{uuid.uuid4().hex}@example.com"})
+
+    r = client.get("/students/", params={"limit": 2})
+    assert r.status_code == 200
+    first_page = r.json()
+    assert len(first_page) == 2
+    cursor = r.headers["X-Next-Cursor"]
+    assert cursor == str(first_page[-1]["id"])
+
+    r = client.get("/students/", params={"limit": 2, "after": cursor})
+    assert r.status_code == 200
+    assert all(s["id"] > int(cursor) for s in r.json())
+
+def test_list_etag_and_invalidation():
+    r = client.get("/courses/")
+    assert r.status_code == 200
+    etag = r.headers["ETag"]
+
+    r = client.get("/courses/", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.content == b""
+
+    code = f"ETAG-{uuid.uuid4().hex[:8]}"
+    client.post("/courses/", json={"title": "Caching", "code": code, "credit_units": 3})
+    r = client.get("/courses/", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+    assert code in [c["code"] for c in r.json()]
+
+def test_course_search_ranked_prefix_and_bulk():
+    word = f"zq{uuid.uuid4().hex[:8]}"
+    in_title = client.post("/courses/", json={"title": f"Intro to {word}", "code": f"S1-{word}", "credit_units": 3}).json()["id"]
+    in_description = client.post("/courses/", json={
+        "title": "Electives", "code": f"S2-{word}", "credit_units": 1, "description": f"touches on {word} briefly"
+    }).json()["id"]
+    body = f"title,code,credit_units,description\n{word} workshop,S3-{word},2,\n"
+    assert client.post("/courses/bulk", content=body, headers={"Content-Type": "text/csv"}).json()["inserted"] == 1
+
+    r = client.get("/courses/search", params={"q": word[:5]})
+    assert r.status_code == 200
+    ids = [c["id"] for c in r.json()]
+    assert len(ids) == 3 and ids[-1] == in_description
+    assert in_title in ids
+
+    # Every word has to match, and paging walks the same ranking
+    assert [c["code"] for c in client.get("/courses/search", params={"q": f"intro {word}"}).json()] == [f"S1-{word}"]
+    page = client.get("/courses/search", params={"q": word, "limit": 2, "offset": 2}).json()
+    assert [c["id"] for c in page] == ids[2:]
+    assert client.get("/courses/search", params={"q": "\"*:"}).json() == []
+
+def test_fast_serialization_matches_schemas(monkeypatch):
+    from sqlalchemy import select
+    from .. import serialization
+    from ..pagination import keyset_statement
+    from ..schemas import CourseOut
+
+    client.post("/courses/", json={
+        "title": "Ünïcode \"quoted\"", "code": f"SER-{uuid.uuid4().hex[:8]}", "credit_units": 2, "capacity": 5
+    })
+    with SessionLocal() as db:
+        expected = [CourseOut.model_validate(c).model_dump() for c in db.scalars(select(Course).order_by(Course.id))]
+        rows = db.execute(keyset_statement(Course, schema=CourseOut)).all()
+    assert client.get("/courses/").json() == expected
+    assert json.loads(serialization.serialize_rows(rows)) == expected
+
+    # Without orjson the stdlib encoder takes over with the same output
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert json.loads(serialization.serialize_rows(rows)) == expected
+    assert serialization.serialize_rows([]) == b"[]"
+
+    schema = app.openapi()["paths"]["/enrollments/"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert schema["items"]["$ref"].endswith("/EnrollmentOut")
+
+def test_expand_eager_loads_and_batch_lookups():
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    tag = uuid.uuid4().hex[:8]
+    students = [client.post("/students/", json={"name": f"X{i}", "email": f"x{i}-{tag}@example.com"}).json()["id"]
+                for i in range(3)]
+    courses = [client.post("/courses/", json={"title": f"X{i}", "code": f"X{i}-{tag}", "credit_units": 1}).json()["id"]
+               for i in range(2)]
+    for student_id in students:
+        for course_id in courses:
+            client.post("/enroll/", json={"student_id": student_id, "course_id": course_id})
+
+    statements = []
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", count)
+    try:
+        r = client.get("/students/", params={"after": students[0] - 1, "limit": 3, "expand": "courses"})
+        student_queries = len(statements)
+        statements.clear()
+        enrollments = client.get("/enrollments/", params={"expand": "course,student"}).json()
+        enrollment_queries = len(statements)
+    finally:
+        event.remove(Engine, "before_cursor_execute", count)
+
+    # One query for the page plus one IN query for all their courses, not one per student
+    assert student_queries == 2
+    assert enrollment_queries == 1
+    assert [s["id"] for s in r.json()] == students
+    assert all([c["id"] for c in s["courses"]] == courses for s in r.json())
+    mine = [e for e in enrollments if e["student_id"] in students]
+    assert len(mine) == 6 and all(e["student"]["id"] == e["student_id"] and e["course"]["id"] == e["course_id"] for e in mine)
+    assert "courses" not in client.get("/students/", params={"limit": 1}).json()[0]
+
+    course = client.get("/courses/", params={"after": courses[0] - 1, "limit": 1, "expand": "students"}).json()[0]
+    assert [s["id"] for s in course["students"]] == students
+    # The expanded page is invalidated by writes to the related tables too
+    client.delete(f"/students/{students[0]}/courses/{courses[0]}")
+    course = client.get("/courses/", params={"after": courses[0] - 1, "limit": 1, "expand": "students"}).json()[0]
+    assert [s["id"] for s in course["students"]] == students[1:]
+
+    assert client.get("/students/", params={"expand": "grades"}).status_code == 400
+    assert client.get("/students/", params={"expand": "courses", "stream": True}).status_code == 400
+
+    r = client.get("/students/batch", params=[("ids", f"{students[2]},{students[0]},{10**9}"), ("ids", str(students[2]))])
+    assert r.status_code == 200
+    assert [s["id"] for s in r.json()] == [students[2], students[0]]
+    assert [c["code"] for c in client.get("/courses/batch", params={"ids": f"{courses[1]}"}).json()] == [f"X1-{tag}"]
+    assert client.get("/courses/batch", params={"ids": "1,abc"}).status_code == 400
+    assert client.get("/courses/batch", params={"ids": ",".join(map(str, range(1, 2002)))}).status_code == 400
+
+def test_students_ndjson_stream():
+    r = client.get("/students/", params={"stream": True})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert [s["id"] for s in rows] == [s["id"] for s in client.get("/students/").json()]
+
+def test_bulk_import_students_reports_conflicts():
+    tag = uuid.uuid4().hex
+    body = (
+        "name,email\n"
+        f"Ada,ada-{tag}@example.com\n"
+        f"Alan,alan-{tag}@example.com\n"
+        f"Ada Again,ada-{tag}@example.com\n"
+        ",missing-name@example.com\n"
+    )
+    r = client.post("/students/bulk", content=body, headers={"Content-Type": "text/csv"})
+    assert r.status_code == 200
+    result = r.json()
+    assert result["received"] == 4
+    assert result["inserted"] == 2
+    assert sorted((e["row"], e["error"]) for e in result["errors"]) == [(3, "duplicate_email"), (4, "invalid_row")]
+
+    # Re-importing the same rows conflicts with what is now in the database
+    r = client.post("/students/bulk", content=body, headers={"Content-Type": "text/csv"})
+    assert r.json()["inserted"] == 0
+
+def test_bulk_import_enrollments_ndjson():
+    tag = uuid.uuid4().hex
+    student_id = client.post("/students/", json={"name": "Bulk", "email": f"bulk-{tag}@example.com"}).json()["id"]
+    course_id = client.post("/courses/", json={"title": "Bulk", "code": f"B-{tag}", "credit_units": 2}).json()["id"]
+
+    lines = [
+        {"student_id": student_id, "course_id": course_id},
+        {"student_id": student_id, "course_id": course_id},
+        {"student_id": 10**9, "course_id": course_id},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines) + "\nnot json\n"
+    r = client.post("/enrollments/bulk", params={"format": "ndjson"}, content=body)
+    assert r.status_code == 200
+    result = r.json()
+    assert result["inserted"] == 1
+    assert sorted(e["error"] for e in result["errors"]) == ["duplicate_enrollment", "invalid_row", "student_not_found"]
+
+def test_bulk_import_rejects_unknown_format():
+    r = client.post("/courses/bulk", content="x", headers={"Content-Type": "text/plain"})
+    assert r.status_code == 415
+
+def test_enroll_unknown_student_or_course():
+    tag = uuid.uuid4().hex
+    student_id = client.post("/students/", json={"name": "FK", "email": f"fk-{tag}@example.com"}).json()["id"]
+    course_id = client.post("/courses/", json={"title": "FK", "code": f"FK-{tag}", "credit_units": 1}).json()["id"]
+
+    r = client.post("/enroll/", json={"student_id": 10**9, "course_id": course_id})
+    assert r.status_code == 404
+    assert r.json()["detail"] == "Student not found"
+
+    r = client.post("/enroll/", json={"student_id": student_id, "course_id": 10**9})
+    assert r.status_code == 404
+    assert r.json()["detail"] == "Course not found"
+
+def test_enroll_batch():
+    tag = uuid.uuid4().hex
+    student_id = client.post("/students/", json={"name": "Batch", "email": f"batch-{tag}@example.com"}).json()["id"]
+    course_ids = [
+        client.post("/courses/", json={"title": "Batch", "code": f"BT{i}-{tag}", "credit_units": 3}).json()["id"]
+        for i in range(2)
+    ]
+    client.post("/enroll/", json={"student_id": student_id, "course_id": course_ids[0]})
+
+    r = client.post("/enroll/batch", json={"student_id": student_id, "course_ids": course_ids + [10**9]})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["enrolled"] == 1
+    assert [p["status"] for p in body["results"]] == ["duplicate_enrollment", "enrolled", "course_not_found"]
+
+    r = client.post("/enroll/batch", json={"student_id": student_id, "student_ids": [student_id]})
+    assert r.status_code == 422
+
+def test_dashboard_aggregates():
+    tag = uuid.uuid4().hex
+    student_id = client.post("/students/", json={"name": "Dash", "email": f"dash-{tag}@example.com"}).json()["id"]
+    idle_id = client.post("/students/", json={"name": "Idle", "email": f"idle-{tag}@example.com"}).json()["id"]
+    course_ids = [
+        client.post("/courses/", json={"title": "Dash", "code": f"DB{i}-{tag}", "credit_units": units}).json()["id"]
+        for i, units in enumerate((3, 4))
+    ]
+    etag = client.get("/dashboard").headers["ETag"]
+    for course_id in course_ids:
+        client.post("/enroll/", json={"student_id": student_id, "course_id": course_id})
+
+    r = client.get("/dashboard", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    body = r.json()
+    students = {s["id"]: s for s in body["students"]}
+    assert (students[student_id]["enrolled_courses"], students[student_id]["total_credit_units"]) == (2, 7)
+    assert (students[idle_id]["enrolled_courses"], students[idle_id]["total_credit_units"]) == (0, 0)
+    courses = {c["id"]: c for c in body["courses"]}
+    assert [courses[i]["enrolled_count"] for i in course_ids] == [1, 1]
+    assert [student_id, course_ids[1]] in body["enrollments"]
+    assert body["total_enrollments"] == len(body["enrollments"])
+
+    assert client.get("/dashboard", headers={"If-None-Match": r.headers["ETag"]}).status_code == 304
+
+def test_course_capacity_and_waitlist():
+    tag = uuid.uuid4().hex
+    course_id = client.post("/courses/", json={"title": "Seats", "code": f"CAP-{tag}", "credit_units": 3, "capacity": 1}).json()["id"]
+    student_ids = [
+        client.post("/students/", json={"name": f"Seat {i}", "email": f"seat{i}-{tag}@example.com"}).json()["id"]
+        for i in range(3)
+    ]
+
+    assert client.post("/enroll/", json={"student_id": student_ids[0], "course_id": course_id}).status_code == 201
+    for position, student_id in enumerate(student_ids[1:], start=1):
+        r = client.post("/enroll/", json={"student_id": student_id, "course_id": course_id})
+        assert r.status_code == 202
+        assert r.json()["waitlist_position"] == position
+    # Asking again keeps the original place in line
+    assert client.post("/enroll/", json={"student_id": student_ids[1], "course_id": course_id}).json()["waitlist_position"] == 1
+    assert client.post("/enroll/", json={"student_id": student_ids[0], "course_id": course_id}).status_code == 400
+    assert client.get(f"/courses/{course_id}").json()["enrolled_count"] == 1
+    assert [s["id"] for s in client.get(f"/courses/{course_id}/waitlist/").json()] == student_ids[1:]
+
+    r = client.delete(f"/students/{student_ids[0]}/courses/{course_id}")
+    assert r.status_code == 200
+    assert r.json()["promoted_student_id"] == student_ids[1]
+    assert [s["id"] for s in client.get(f"/courses/{course_id}/students/").json()] == [student_ids[1]]
+    assert client.get(f"/courses/{course_id}").json()["enrolled_count"] == 1
+    assert client.delete(f"/students/{student_ids[0]}/courses/{course_id}").status_code == 404
+
+    r = client.post("/enroll/batch", json={"course_id": course_id, "student_ids": [student_ids[0]]})
+    assert r.json()["results"][0]["status"] == "course_full"
+
+def test_concurrent_enrollments_never_oversell():
+    from concurrent.futures import ThreadPoolExecutor
+
+    tag = uuid.uuid4().hex
+    course_id = client.post("/courses/", json={"title": "Rush", "code": f"RUSH-{tag}", "credit_units": 3, "capacity": 3}).json()["id"]
+    student_ids = [
+        client.post("/students/", json={"name": f"Rush {i}", "email": f"rush{i}-{tag}@example.com"}).json()["id"]
+        for i in range(12)
+    ]
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        codes = list(pool.map(
+            lambda student_id: client.post("/enroll/", json={"student_id": student_id, "course_id": course_id}).status_code,
+            student_ids
+        ))
+    assert sorted(codes) == [201] * 3 + [202] * 9
+    assert client.get(f"/courses/{course_id}").json()["enrolled_count"] == 3
+    assert len(client.get(f"/courses/{course_id}/students/").json()) == 3
+
+def test_upgrade_adds_and_backfills_seat_columns(tmp_path):
+    from sqlalchemy import create_engine, text
+    from ..migrations import upgrade
+
+    old_engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with old_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE courses (id INTEGER PRIMARY KEY, title VARCHAR, code VARCHAR, credit_units INTEGER, description VARCHAR)"))
+        conn.execute(text("CREATE TABLE enrollments (id INTEGER PRIMARY KEY, student_id INTEGER, course_id INTEGER)"))
+        conn.execute(text("INSERT INTO courses VALUES (1, 'Old', 'OLD1', 3, NULL), (2, 'Empty', 'OLD2', 3, NULL)"))
+        conn.execute(text("INSERT INTO enrollments VALUES (1, 1, 1), (2, 2, 1)"))
+
+    upgrade(old_engine)
+    upgrade(old_engine)  # a second run is a no-op
+    with old_engine.connect() as conn:
+        rows = conn.execute(text("SELECT id, capacity, enrolled_count FROM courses ORDER BY id")).all()
+        # Course rosters get an index of their own instead of scanning enrollments
+        plan = conn.execute(text("EXPLAIN QUERY PLAN SELECT student_id FROM enrollments WHERE course_id = 1")).all()
+    assert [tuple(row) for row in rows] == [(1, None, 2), (2, None, 0)]
+    assert "ix_enrollments_course_id" in " ".join(row[-1] for row in plan)
+
+def test_async_routes():
+    from fastapi import FastAPI
+    from ..async_routes import router
+
+    async_app = FastAPI()
+    async_app.include_router(router)
+    tag = uuid.uuid4().hex
+
+    # One client for the whole test keeps the pooled aiosqlite connections on one event loop
+    with TestClient(async_app) as async_client:
+        r = async_client.post("/students/", json={"name": "Async", "email": f"async-{tag}@example.com"})
+        assert r.status_code == 201
+        student_id = r.json()["id"]
+        r = async_client.post("/courses/", json={"title": "Async", "code": f"AS-{tag}", "credit_units": 2})
+        assert r.status_code == 201
+        course_id = r.json()["id"]
+
+        assert async_client.post("/enroll/", json={"student_id": student_id, "course_id": course_id}).status_code == 201
+        r = async_client.post("/enroll/", json={"student_id": student_id, "course_id": course_id})
+        assert r.status_code == 400
+        r = async_client.post("/enroll/", json={"student_id": 10**9, "course_id": course_id})
+        assert r.status_code == 404
+        assert r.json()["detail"] == "Student not found"
+
+        r = async_client.get(f"/students/{student_id}/courses/")
+        assert [c["id"] for c in r.json()] == [course_id]
+        r = async_client.get(f"/courses/{course_id}/students/")
+        assert [s["id"] for s in r.json()] == [student_id]
+
+        r = async_client.get("/students/", params={"limit": 1, "after": student_id - 1})
+        assert [s["id"] for s in r.json()] == [student_id]
+        r = async_client.get("/students/", params={"stream": True})
+        assert [json.loads(line)["id"] for line in r.text.splitlines()] == [s["id"] for s in client.get("/students/").json()]
+
+        dashboard = async_client.get("/dashboard").json()
+        assert next(c for c in dashboard["courses"] if c["id"] == course_id)["enrolled_count"] == 1
+
+def test_tips_cache_single_flight_and_lru():
+    from ..tips_cache import TipsCache
+
+    cache = TipsCache(max_entries=2, ttl=60)
+    calls = []
+
+    async def slow_compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return ["tip"]
+
+    async def scenario():
+        request = TipsRequest(course_title="Physics", credit_units=4)
+        results = await asyncio.gather(*(cache.get_or_compute(request, slow_compute) for _ in range(8)))
+        assert results == [["tip"]] * 8
+        assert len(calls) == 1
+
+        # Normalized title hits the same entry
+        assert await cache.get_or_compute(TipsRequest(course_title="  physics ", credit_units=4), slow_compute) == ["tip"]
+        assert len(calls) == 1
+
+        for title in ("Chemistry", "Biology"):
+            async def compute(title=title):
+                return [title]
+            await cache.get_or_compute(TipsRequest(course_title=title, credit_units=4), compute)
+
+    asyncio.run(scenario())
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert stats["misses"] == 3
+    assert stats["coalesced"] == 7
+    assert stats["hits"] == 1
+
+def test_tips_cache_persistent_tier():
+    from ..tips_cache import TipsCache
+
+    request = TipsRequest(course_title=f"Persist {uuid.uuid4().hex}", credit_units=3)
+
+    async def stored():
+        return ["stored"]
+
+    async def recomputed():
+        return ["recomputed"]
+
+    asyncio.run(TipsCache(persistent=True).get_or_compute(request, stored))
+
+    # A fresh process-level cache falls back to the table before calling upstream
+    cache = TipsCache(persistent=True)
+    assert asyncio.run(cache.get_or_compute(request, recomputed)) == ["stored"]
+    assert cache.stats()["persistent_hits"] == 1
+
+def test_circuit_breaker_opens_and_recovers():
+    from ..genai import CircuitBreaker
+
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()  # one trial call
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+def parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+def test_study_tips_stream_without_key(monkeypatch):
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    r = client.get("/genai/study-tips/stream", params={"course_title": "Physics", "credit_units": 4})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(r.text)
+    assert events[-1][0] == "done"
+    assert [data["tip"] for name, data in events[:-1]] == events[-1][1]["tips"]
+
+def test_study_tips_stream_from_groq(monkeypatch):
+    from types import SimpleNamespace
+    from .. import genai
+
+    class FakeStream:
+        def __init__(self, pieces):
+            self.pieces = pieces
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            if not self.pieces:
+                raise StopAsyncIteration
+            content = self.pieces.pop(0)
+            return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+    class FakeCompletions:
+        async def create(self, **kwargs):
+            assert kwargs["stream"] is True
+            return FakeStream(["1. Read the chapter before each lec", "ture\n2. Solve ten practice ", "problems every week\n"])
+
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(genai, "get_client", lambda: fake_client)
+
+    title = f"Streamed {uuid.uuid4().hex}"
+    r = client.get("/genai/study-tips/stream", params={"course_title": title, "credit_units": 3})
+    events = parse_sse(r.text)
+    assert events[0] == ("tip", {"tip": "Read the chapter before each lecture"})
+    assert events[1] == ("tip", {"tip": "Solve ten practice problems every week"})
+    assert events[-1][1]["source"] == "groq"
+
+    # The streamed answer is now cached for the plain endpoint
+    r = client.post("/genai/study-tips", json={"course_title": title, "credit_units": 3})
+    assert r.json()["tips"] == events[-1][1]["tips"]
+
+def test_study_tips_cache_stats():
+    r = client.get("/genai/study-tips/cache")
+    assert r.status_code == 200
+    assert {"hits", "misses", "size"} <= r.json().keys()
+
+def test_metrics_endpoint_and_query_instrumentation(caplog):
+    from fastapi import FastAPI
+    from ..metrics import MetricsMiddleware, REQUEST_QUERIES
+
+    student_id = client.post("/students/", json={"name": "Metrics", "email": f"metrics-{uuid.uuid4().hex}@example.com"}).json()["id"]
+    before = REQUEST_QUERIES.count("GET", "/students/{student_id}")
+    client.get(f"/students/{student_id}")
+    assert REQUEST_QUERIES.count("GET", "/students/{student_id}") == before + 1
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_requests_total{method="GET",route="/students/{student_id}",status="200"}' in r.text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/students/{student_id}",le="+Inf"}' in r.text
+    assert "# TYPE http_requests_in_flight gauge" in r.text
+    assert "db_queries_total " in r.text
+
+    # Response headers and the slow-request log are opt-in
+    instrumented = FastAPI()
+    instrumented.add_middleware(MetricsMiddleware, response_headers=True, slow_request_seconds=0)
+
+    @instrumented.get("/lookup/{student_id}")
+    def lookup(student_id: int):
+        with SessionLocal() as db:
+            db.get(Student, student_id)
+            db.get(Course, student_id)
+        return {}
+
+    with caplog.at_level("WARNING", logger="api.metrics"):
+        r = TestClient(instrumented).get(f"/lookup/{student_id}")
+    assert r.headers["x-db-queries"] == "2"
+    assert r.headers["server-timing"].startswith("app;dur=")
+    assert "Slow request GET /lookup/" in caplog.text and "FROM courses" in caplog.text
+
+def test_failed_statements_are_counted_and_leave_no_state():
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    from ..metrics import DB_QUERIES, DB_QUERY_ERRORS
+
+    queries, errors = DB_QUERIES.value(), DB_QUERY_ERRORS.value()
+    with SessionLocal() as db:
+        for _ in range(3):
+            try:
+                db.execute(text("SELECT * FROM no_such_table"))
+            except OperationalError:
+                db.rollback()
+        db.execute(text("SELECT 1"))
+        info = dict(db.connection().info)
+    assert DB_QUERY_ERRORS.value() == errors + 3
+    assert DB_QUERIES.value() == queries + 4
+    assert "query_started" not in info
+
+def test_structured_logging_pipeline(monkeypatch):
+    import dataclasses
+    import io
+    import logging
+    import threading
+    from ..config import get_settings
+    from ..log_config import configure_logging, stop_logging
+
+    class Rendered:
+        threads = []
+
+        def __str__(self):
+            self.threads.append(threading.current_thread().name)
+            return "rendered"
+
+    stream = io.StringIO()
+    settings = dataclasses.replace(
+        get_settings(), log_format="json", log_level="INFO", log_levels="test.quiet=WARNING", log_sample="test.sampled=0.25"
+    )
+    # Keep pytest's own capture handlers from rendering the records too
+    monkeypatch.setattr(logging.getLogger(), "handlers", [])
+    try:
+        configure_logging(settings, stream=stream)
+        logging.getLogger("test.quiet").info("suppressed %s", Rendered())
+        logging.getLogger("test.app").info("value %s", Rendered(), extra={"request_id": "abc"})
+        state = {"seats": 1}
+        logging.getLogger("test.app").info("state %s", state)
+        state["seats"] = 0
+        for i in range(8):
+            logging.getLogger("test.sampled.child").info("event %s", i)
+        logging.getLogger("test.sampled").warning("always kept")
+        stop_logging()
+    finally:
+        configure_logging(get_settings())
+
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert entries[0]["message"] == "value rendered" and entries[0]["request_id"] == "abc"
+    # Objects are rendered once, on the logging thread, as they were at the call
+    # (and never for the suppressed record); only primitives wait for the writer
+    assert Rendered.threads == [threading.current_thread().name]
+    assert entries[1]["message"] == "state {'seats': 1}"
+    sampled = [e for e in entries if e["logger"] == "test.sampled.child"]
+    assert [e["message"] for e in sampled] == ["event 0", "event 4"]
+    assert sampled[0]["sample_rate"] == 0.25
+    assert entries[-1]["message"] == "always kept"
+
+def test_cold_start_defers_schema_and_optional_imports(tmp_path):
+    from sqlalchemy import create_engine, inspect
+    from ..bench.startup import profile_startup
+    from ..migrations import main as migrate_main
+
+    url = f"sqlite:///{tmp_path / 'cold.db'}"
+    report = profile_startup({
+        "DATABASE_URL": url, "DB_ASYNC": "false", "DB_AUTO_MIGRATE": "false", "RECOMMENDATIONS": "false", "LOG_LEVEL": "WARNING"
+    })
+    assert report["loaded"] == []
+    assert report["packages_us"]["api"] > 0 and report["slowest_modules"]
+    assert not (tmp_path / "cold.db").exists() or not inspect(create_engine(url)).get_table_names()
+
+    migrate_main(["--database-url", url])
+    assert {"students", "courses", "enrollments", "courses_fts"} <= set(inspect(create_engine(url)).get_table_names())
+
+def test_write_queue_group_commit(tmp_path):
+    from fastapi import HTTPException
+    from sqlalchemy import create_engine, event, func, select
+    from sqlalchemy.orm import sessionmaker
+    from ..database import Base
+    from ..schemas import StudentCreate
+    from ..write_queue import WriteCoordinator
+    from ..writes import insert_student
+
+    queue_engine = create_engine(f"sqlite:///{tmp_path / 'queue.db'}")
+    Base.metadata.create_all(queue_engine)
+    commits = []
+    event.listen(queue_engine, "commit", lambda conn: commits.append(conn))
+
+    coordinator = WriteCoordinator(sessionmaker(bind=queue_engine), window=0.05)
+    try:
+        futures = [
+            coordinator.submit(insert_student, StudentCreate(name=f"Q{i}", email=f"q{i % 20}@example.com"))
+            for i in range(25)
+        ]
+        errors = [f.exception(timeout=5) for f in futures]
+    finally:
+        coordinator.stop()
+
+    # One transaction for all 25; the 5 duplicate emails fail alone without undoing the rest
+    assert len(commits) == 1
+    assert [type(e) for e in errors if e] == [HTTPException] * 5 and all(e.status_code == 400 for e in errors if e)
+    assert [f.result().email for f in futures[:20]] == [f"q{i}@example.com" for i in range(20)]
+    with queue_engine.connect() as conn:
+        assert conn.scalar(select(func.count()).select_from(Student)) == 20
+
+def test_change_feed_resume_and_reset():
+    from ..change_feed import ChangeFeed
+
+    def frames(text):
+        return [dict(line.split(": ", 1) for line in block.splitlines()) for block in text.strip().split("\n\n")]
+
+    async def scenario():
+        feed = ChangeFeed(history=3)
+        for i in range(5):
+            feed.publish("student_created", {"id": i})
+        epoch = feed.epoch
+
+        async def read(after, count):
+            stream = feed.stream(after, heartbeat=0.01)
+            try:
+                return [await stream.__anext__() for _ in range(count)]
+            finally:
+                await stream.aclose()
+
+        # Resuming inside the kept history replays exactly what was missed
+        resumed = frames("".join(await read(f"{epoch}-3", 3)))
+        assert resumed[0] == {"retry": "3000"}
+        assert [(f["id"], f["event"], json.loads(f["data"])) for f in resumed[1:]] == [
+            (f"{epoch}-4", "student_created", {"id": 3}), (f"{epoch}-5", "student_created", {"id": 4})
+        ]
+        # Too far behind, ahead of this feed, or from another process (a restart
+        # or another worker, whose sequence numbers mean nothing here): refetch
+        for after in (f"{epoch}-1", f"{epoch}-99", "0123456789ab-3", "3", "junk"):
+            reset = frames((await read(after, 2))[1])[0]
+            assert reset["event"] == "reset" and json.loads(reset["data"]) == {"seq": f"{epoch}-5"}
+
+        # Live events reach a subscriber, even when published from another thread
+        stream = feed.stream(None, heartbeat=0.01)
+        assert (await stream.__anext__()).startswith("retry")
+        assert await stream.__anext__() == ": keep-alive\n\n"
+        await asyncio.to_thread(feed.publish, "enrolled", {"student_id": 1, "course_id": 2})
+        live = await stream.__anext__()
+        while live.startswith(":"):
+            live = await stream.__anext__()
+        assert frames(live)[0]["id"] == f"{epoch}-6"
+        await stream.aclose()
+        assert not feed._subscribers
+
+    asyncio.run(scenario())
+
+def test_mutations_publish_change_events():
+    from ..change_feed import change_feed
+
+    seq = change_feed.seq
+    r = client.post("/students/", json={"name": "Feed", "email": f"feed-{uuid.uuid4().hex[:8]}@example.com"})
+    student = r.json()
+    r = client.post("/courses/", json={"title": "Feeds", "code": f"FD{uuid.uuid4().hex[:6]}", "credit_units": 2, "capacity": 1})
+    course = r.json()
+    client.post("/enroll/", json={"student_id": student["id"], "course_id": course["id"]})
+    client.delete(f"/students/{student['id']}/courses/{course['id']}")
+
+    events = [(e.kind, e.data) for e in change_feed._history if e.seq > seq]
+    assert events == [
+        ("student_created", student),
+        ("course_created", course),
+        ("enrolled", {"student_id": student["id"], "course_id": course["id"]}),
+        ("unenrolled", {"student_id": student["id"], "course_id": course["id"], "promoted_student_id": None}),
+    ]
+    # The dashboard says which event it is current up to, for /events?after=
+    r = client.get("/dashboard")
+    assert r.headers["X-Change-Seq"] == change_feed.position == f"{change_feed.epoch}-{change_feed.seq}"
+
+def test_enrollment_graph_adjacency(monkeypatch):
+    from array import array
+    from .. import enrollment_graph as graph_module
+    from ..enrollment_graph import _Adjacency
+
+    edges = _Adjacency.build(array("i", [1, 1, 3]), array("i", [10, 20, 10]))
+    assert [edges.neighbours(n) for n in range(5)] == [[], [10, 20], [], [10], []]
+    assert (1, 20) in edges and (3, 20) not in edges
+
+    # Changes land in the overlay, idempotently, until there are enough to rebuild
+    assert edges.add(3, 5) and not edges.add(3, 5) and edges.remove(1, 10) and not edges.remove(1, 10)
+    assert edges.add(7, 1) and edges.remove(7, 1)
+    assert (edges.neighbours(1), edges.neighbours(3), edges.overlay) == ([20], [5, 10], 2)
+    monkeypatch.setattr(graph_module, "COMPACT_MIN", 0)
+    assert edges.needs_compaction()
+    compacted = edges.compacted()
+    assert (compacted.overlay, compacted.targets.tolist()) == (0, [20, 5, 10])
+
+def test_enrollment_graph_serves_rosters(monkeypatch):
+    from sqlalchemy import insert
+    from .. import enrollment_graph as graph_module
+    from ..change_feed import change_feed
+    from ..enrollment_graph import EnrollmentGraph
+    from ..models import Enrollment
+
+    tag = uuid.uuid4().hex[:8]
+    students = [client.post("/students/", json={"name": f"G{i}", "email": f"g{i}-{tag}@example.com"}).json()["id"]
+                for i in range(3)]
+    courses = [client.post("/courses/", json={"title": f"Graph {i}", "code": f"GR{i}{tag}", "credit_units": 3,
+                                              "capacity": 2}).json()["id"] for i in range(2)]
+    client.post("/enroll/", json={"student_id": students[0], "course_id": courses[0]})
+
+    graph = EnrollmentGraph(refresh=0)
+    graph.load()
+    monkeypatch.setattr(graph_module, "enrollment_graph", graph)
+    monkeypatch.setattr(change_feed, "_listeners", [graph.apply])
+
+    # Writes through the API are applied in place, waitlist promotions included
+    for student_id in students:
+        client.post("/enroll/", json={"student_id": student_id, "course_id": courses[1]})
+    client.post("/enroll/", json={"student_id": students[1], "course_id": courses[0]})
+    assert graph.students_of(courses[1]) == students[:2]
+    client.delete(f"/students/{students[0]}/courses/{courses[1]}")
+    assert graph.students_of(courses[1]) == students[1:]
+    assert graph.courses_of(students[1]) == courses
+
+    r = client.get(f"/courses/{courses[1]}/students/")
+    assert r.status_code == 200 and [s["id"] for s in r.json()] == students[1:]
+    assert [c["code"] for c in client.get(f"/students/{students[1]}/courses/").json()] == [f"GR0{tag}", f"GR1{tag}"]
+    # Empty or unknown rosters still go to the database, which also tells them apart
+    assert client.get(f"/students/{students[0]}/courses/").json()[0]["id"] == courses[0]
+    assert client.get("/courses/999999/students/").status_code == 404
+
+    # Rosters come from the graph, so a row written behind its back only shows up after a reload
+    with SessionLocal() as db:
+        db.execute(insert(Enrollment).values(student_id=students[0], course_id=courses[1]))
+        db.commit()
+    assert len(client.get(f"/courses/{courses[1]}/students/").json()) == 2
+    graph.load()
+    assert len(client.get(f"/courses/{courses[1]}/students/").json()) == 3
+
+def test_course_recommendations(monkeypatch):
+    import pytest
+    from .. import recommendations
+    from ..change_feed import change_feed
+
+    monkeypatch.setattr(recommendations, "co_enrollment", None)
+    assert client.get("/courses/1/recommendations/").status_code == 503
+    pytest.importorskip("scipy")
+
+    tag = uuid.uuid4().hex[:8]
+    students = [client.post("/students/", json={"name": f"R{i}", "email": f"r{i}-{tag}@example.com"}).json()["id"]
+                for i in range(4)]
+    courses = [client.post("/courses/", json={"title": f"Rec {i}", "code": f"RC{i}{tag}", "credit_units": 3}).json()["id"]
+               for i in range(4)]
+    for student_index, course_indexes in enumerate([(0, 1, 2), (0, 1), (0, 2), (1,)]):
+        for i in course_indexes:
+            client.post("/enroll/", json={"student_id": students[student_index], "course_id": courses[i]})
+
+    co = recommendations.CoEnrollment(window=0)
+    assert co.recommend(courses[0], 5) is None
+    co.load()
+    monkeypatch.setattr(recommendations, "co_enrollment", co)
+    monkeypatch.setattr(change_feed, "_listeners", [co.apply])
+
+    # Two of course 0's students also took course 1, two took course 2; ties go to the lower id
+    r = client.get(f"/courses/{courses[0]}/recommendations/")
+    assert [(c["id"], c["co_enrolled"], c["code"]) for c in r.json()] == [
+        (courses[1], 2, f"RC1{tag}"), (courses[2], 2, f"RC2{tag}")
+    ]
+    assert client.get(f"/courses/{courses[3]}/recommendations/").json() == []
+    assert client.get("/courses/999999/recommendations/").status_code == 404
+
+    # Changes from the feed are applied incrementally, and match a full rebuild
+    client.post("/enroll/", json={"student_id": students[3], "course_id": courses[0]})
+    client.post("/enroll/", json={"student_id": students[3], "course_id": courses[3]})
+    client.delete(f"/students/{students[2]}/courses/{courses[2]}")
+    changes, _, _ = co._collect()
+    co.update(changes + changes)  # replaying a change doesn't count it twice
+    assert co.recommend(courses[0], 5) == [(courses[1], 3), (courses[2], 1), (courses[3], 1)]
+    assert co.recommend(courses[3], 1) == [(courses[0], 1)]
+    incremental = dict(co._top)
+    co.load()
+    assert {c: incremental.get(c, []) for c in courses} == {c: co._top.get(c, []) for c in courses}
+
+    # With no changes arriving, the loop still rebuilds once the refresh is due
+    co.refresh = 0.01
+    assert co._collect() == ([], True, False)
+
+def test_exports_stream_csv_gzip_and_parquet(tmp_path):
+    import csv
+    import gzip
+    import io
+    import pytest
+    from ..export import main as export_main
+
+    tag = uuid.uuid4().hex[:8]
+    students = [client.post("/students/", json={"name": f"X{i}", "email": f"x{i}-{tag}@example.com"}).json()["id"]
+                for i in range(2)]
+    courses = [client.post("/courses/", json={"title": f"Export {i}", "code": f"EX{i}{tag}", "credit_units": i + 2}).json()["id"]
+               for i in range(2)]
+    for student_id, course_id in [(students[0], courses[0]), (students[0], courses[1]), (students[1], courses[1])]:
+        client.post("/enroll/", json={"student_id": student_id, "course_id": course_id})
+
+    r = client.get("/export/roster", params={"course_id": courses[1]})
+    assert r.headers["content-type"].startswith("text/csv")
+    assert r.headers["content-disposition"] == 'attachment; filename="roster.csv"'
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert [(int(row["student_id"]), row["course_code"]) for row in rows] == [(s, f"EX1{tag}") for s in students]
+
+    # Transcripts carry each student's credit total on every row
+    r = client.get("/export/transcripts", params={"student_id": students[0], "gzip": "true"})
+    assert r.headers["content-type"] == "application/gzip"
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(r.content).decode())))
+    assert [(row["course_code"], row["credit_units"], row["total_credit_units"]) for row in rows] == [
+        (f"EX0{tag}", "2", "5"), (f"EX1{tag}", "3", "5")
+    ]
+    # A chunk boundary inside a student's rows doesn't split their total
+    export_main(["transcripts", "-o", str(tmp_path / "t.csv.gz"), "--student-id", str(students[0]), "--chunk-size", "1"])
+    assert gzip.decompress((tmp_path / "t.csv.gz").read_bytes()).decode() == gzip.decompress(r.content).decode()
+
+    assert client.get("/export/grades").status_code == 404
+    assert client.get("/export/roster", params={"format": "xlsx"}).status_code == 400
+
+    pq = pytest.importorskip("pyarrow.parquet")
+    r = client.get("/export/enrollments", params={"format": "parquet", "course_id": courses[0]})
+    table = pq.read_table(io.BytesIO(r.content))
+    assert table.schema.field("credit_units").type == "int64"
+    assert table.to_pylist()[0]["student_email"] == f"x0-{tag}@example.com"
+
+def test_benchmark_seed_and_driver(tmp_path):
+    import httpx
+    import random
+    from sqlalchemy import create_engine, func, select
+    from ..bench.run import ENDPOINTS, Workload, drive, percentile
+    from ..bench.seed import DatasetSize, seed_database
+    from ..models import Course, Enrollment
+
+    size = DatasetSize(students=20, courses=5, enrollments=30)
+    database_url = f"sqlite:///{tmp_path / 'bench.db'}"
+    seed_database(database_url, size)
+    with create_engine(database_url).connect() as conn:
+        assert conn.scalar(select(func.count()).select_from(Enrollment)) == 30
+        assert conn.scalar(select(func.sum(Course.enrolled_count))) == 30
+
+    assert percentile([1, 2, 3, 4], 50) == 2
+    assert percentile([1, 2, 3, 4], 99) == 4
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as bench_client:
+            health = next(e for e in ENDPOINTS if e.name == "GET /health")
+            return await drive(bench_client, health, Workload(size, random.Random(1), "test"), requests=6, concurrency=3)
+
+    result = asyncio.run(run())
+    assert result["status_codes"] == {"200": 6}
+    assert result["errors"] == 0
+    assert set(result["latency_ms"]) == {"p50", "p95", "p99", "mean", "max"}
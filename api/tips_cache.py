@@ -0,0 +1,191 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from .config import Settings
+from .database import SessionLocal
+from .models import StudyTipsCacheEntry
+from .schemas import TipsRequest
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(request: TipsRequest) -> str:
+    # Tips only depend on the title and credit units, so "Intro  to Physics"
+    # and "intro to physics" share an entry
+    title = " ".join(request.course_title.split()).casefold()
+    return f"{request.credit_units}:{title}"
+
+
+def _consume_exception(task: asyncio.Future):
+    # Mark the failure as seen even if every waiter has gone away
+    if not task.cancelled():
+        task.exception()
+
+
+class TipsCache:
+    """LRU + TTL cache for study tips, with an optional table-backed second tier.
+
+    Concurrent misses for the same key are collapsed: the first caller starts
+    compute() and everyone else awaits its result instead of calling upstream.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 86400, persistent: bool = False,
+                 session_factory=SessionLocal):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persistent = persistent
+        self.session_factory = session_factory
+
+        self._entries: OrderedDict[str, tuple[float, list[str]]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "persistent_hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "TipsCache":
+        return cls(
+            max_entries=settings.tips_cache_size,
+            ttl=settings.tips_cache_ttl,
+            persistent=settings.tips_cache_persist,
+        )
+
+    async def get_or_compute(self, request: TipsRequest, compute: Callable[[], Awaitable[list[str]]]) -> list[str]:
+        key = cache_key(request)
+
+        with self._lock:
+            tips = self._get_fresh(key)
+            if tips is not None:
+                self._stats["hits"] += 1
+                return tips
+            task = self._inflight.get(key)
+            if task is None:
+                # The fill runs as its own task so a disconnecting first caller
+                # doesn't cancel the upstream call everyone else is waiting on
+                task = self._inflight[key] = asyncio.ensure_future(self._fill(key, compute))
+                task.add_done_callback(_consume_exception)
+            else:
+                self._stats["coalesced"] += 1
+
+        return await asyncio.shield(task)
+
+    async def get(self, request: TipsRequest) -> list[str] | None:
+        """Cache lookup without computing, for callers that fill the cache themselves."""
+        key = cache_key(request)
+        with self._lock:
+            tips = self._get_fresh(key)
+            if tips is not None:
+                self._stats["hits"] += 1
+                return tips
+        tips = await self._aload_persistent(key)
+        with self._lock:
+            if tips is None:
+                self._stats["misses"] += 1
+            else:
+                self._stats["persistent_hits"] += 1
+                self._put(key, tips)
+        return tips
+
+    async def put(self, request: TipsRequest, tips: list[str]):
+        key = cache_key(request)
+        await self._astore_persistent(key, tips)
+        with self._lock:
+            self._put(key, tips)
+
+    async def _fill(self, key: str, compute) -> list[str]:
+        try:
+            tips = await self._aload_persistent(key)
+            if tips is None:
+                with self._lock:
+                    self._stats["misses"] += 1
+                tips = await compute()
+                await self._astore_persistent(key, tips)
+            else:
+                with self._lock:
+                    self._stats["persistent_hits"] += 1
+            with self._lock:
+                self._put(key, tips)
+            return tips
+        except Exception:
+            # Waiters see the same failure; nothing is cached, so the next request retries
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["persistent_hits"] + self._stats["misses"]
+            hit_ratio = (self._stats["hits"] + self._stats["persistent_hits"]) / lookups if lookups else 0.0
+            return {
+                **self._stats,
+                "hit_ratio": round(hit_ratio, 4),
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "persistent": self.persistent,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # _get_fresh and _put expect the caller to hold self._lock
+
+    def _get_fresh(self, key: str) -> list[str] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, tips = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return tips
+
+    def _put(self, key: str, tips: list[str]):
+        self._entries[key] = (time.monotonic() + self.ttl, tips)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # Persistent tier I/O is blocking, so it runs off the event loop
+
+    async def _aload_persistent(self, key: str) -> list[str] | None:
+        if not self.persistent:
+            return None
+        return await asyncio.to_thread(self._load_persistent, key)
+
+    async def _astore_persistent(self, key: str, tips: list[str]):
+        if self.persistent:
+            await asyncio.to_thread(self._store_persistent, key, tips)
+
+    def _load_persistent(self, key: str) -> list[str] | None:
+        if not self.persistent:
+            return None
+        try:
+            with self.session_factory() as db:
+                entry = db.get(StudyTipsCacheEntry, key)
+                if entry is None or entry.created_at + self.ttl <= time.time():
+                    return None
+                return json.loads(entry.tips)
+        except Exception as e:
+            # The persistent tier is an optimization; never fail a request over it
+            logger.warning("Study tips cache read failed: %s", e)
+            return None
+
+    def _store_persistent(self, key: str, tips: list[str]):
+        if not self.persistent:
+            return
+        try:
+            with self.session_factory() as db:
+                db.merge(StudyTipsCacheEntry(key=key, tips=json.dumps(tips), created_at=time.time()))
+                db.commit()
+        except Exception as e:
+            logger.warning("Study tips cache write failed: %s", e)
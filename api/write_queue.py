@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .config import Settings, get_settings
+from .database import SessionLocal
+from .metrics import WRITE_BATCH_SIZE, WRITE_BATCH_DURATION
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteCoordinator:
+    """Group commit: one writer thread runs queued operations in shared transactions.
+
+    Each operation is a function of a Session that flushes but doesn't commit.
+    The writer takes whatever is pending (waiting up to `window` seconds for
+    more), runs them all in one transaction, commits once, and then resolves
+    every caller's future with its own result or exception. If any operation
+    fails, the batch is rolled back and rerun with each operation in its own
+    SAVEPOINT, so a failure only undoes that operation. With SQLite that is
+    one fsync and one lock acquisition per batch instead of one per request,
+    and the routes that write through it don't contend with each other for
+    the lock. Bulk imports and the persistent study tips cache still commit
+    on their own sessions, so the writer can wait on them (and they can get
+    "database is locked" once busy_timeout runs out).
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal,
+                 window: float = 0.002, max_batch: int = 128):
+        self.session_factory = session_factory
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "WriteCoordinator | None":
+        if not settings.write_queue:
+            return None
+        return cls(window=settings.write_queue_window_ms / 1000, max_batch=settings.write_queue_max_batch)
+
+    def submit(self, op: Callable, *args) -> Future:
+        """Queue op(session, *args); the future resolves once its batch has committed."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((op, args, future))
+        return future
+
+    def run(self, op: Callable, *args):
+        """submit() and wait, for threadpool route handlers."""
+        return self.submit(op, *args).result()
+
+    async def arun(self, op: Callable, *args):
+        return await asyncio.wrap_future(self.submit(op, *args))
+
+    def _ensure_started(self):
+        # Started on first write, so importing the app doesn't spawn threads
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="write-queue", daemon=True)
+                    self._thread.start()
+
+    def stop(self):
+        """Commit whatever is already queued, then stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _loop(self):
+        while True:
+            batch, stop = self._collect()
+            if batch:
+                self._commit_batch(batch)
+            if stop:
+                return
+
+    def _collect(self) -> tuple[list, bool]:
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                # Drain what piled up during the last commit, then wait out the window
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _commit_batch(self, batch: list):
+        started = time.perf_counter()
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        try:
+            # Optimistically without savepoints; failures are rare, and only
+            # then is the batch redone with each operation isolated
+            outcomes = self._run_batch(batch, isolate=False)
+            if outcomes is None:
+                outcomes = self._run_batch(batch, isolate=True)
+        except Exception as e:
+            logger.error("Write batch of %s failed to commit: %s", len(batch), e)
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        WRITE_BATCH_SIZE.observe(len(batch))
+        WRITE_BATCH_DURATION.observe(time.perf_counter() - started)
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _run_batch(self, batch: list, isolate: bool) -> list | None:
+        """Run and commit the batch; None if an operation failed and isolate is off."""
+        outcomes = []
+        with self.session_factory() as db:
+            try:
+                if db.get_bind().dialect.name == "sqlite":
+                    # Take the write lock up front instead of upgrading to it mid-batch
+                    db.execute(text("BEGIN IMMEDIATE"))
+                for op, args, future in batch:
+                    if not isolate:
+                        outcomes.append((future, op(db, *args), None))
+                        continue
+                    try:
+                        with db.begin_nested():
+                            outcomes.append((future, op(db, *args), None))
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+                db.commit()
+            except Exception:
+                db.rollback()
+                if isolate:
+                    raise
+                return None
+        return outcomes
+
+
+write_coordinator = WriteCoordinator.from_settings(get_settings())
+
+
+def run_write(db: Session, op: Callable, *args):
+    """Run op(session, *args) and commit it, through the write queue when WRITE_QUEUE is on."""
+    if write_coordinator is not None:
+        return write_coordinator.run(op, *args)
+    try:
+        result = op(db, *args)
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+
+
+async def arun_write(db, op: Callable, *args):
+    """run_write for AsyncSession routes; op still takes a sync Session."""
+    if write_coordinator is not None:
+        return await write_coordinator.arun(op, *args)
+    try:
+        result = await db.run_sync(op, *args)
+        await db.commit()
+        return result
+    except Exception:
+        await db.rollback()
+        raise
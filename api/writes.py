@@ -0,0 +1,42 @@
+import logging
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .models import Student, Course
+from .schemas import StudentCreate, StudentOut, CourseCreate, CourseOut
+
+logger = logging.getLogger(__name__)
+
+# Write operations for run_write(): each takes a Session, flushes but leaves
+# committing to the caller, and returns plain schema objects that outlive the
+# session they were created in.
+
+
+def insert_student(db: Session, student: StudentCreate) -> StudentOut:
+    if db.scalar(select(Student.id).where(Student.email == student.email)):
+        logger.warning("Student with email %s already exists", student.email)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Student with this email already exists"
+        )
+
+    db_student = Student(**student.model_dump())
+    db.add(db_student)
+    db.flush()
+    return StudentOut.model_validate(db_student)
+
+
+def insert_course(db: Session, course: CourseCreate) -> CourseOut:
+    if db.scalar(select(Course.id).where(Course.code == course.code)):
+        logger.warning("Course with code %s already exists", course.code)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Course with this code already exists"
+        )
+
+    db_course = Course(**course.model_dump())
+    db.add(db_course)
+    db.flush()
+    return CourseOut.model_validate(db_course)